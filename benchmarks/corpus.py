@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Script to generate reproducible files of synthetic MARC records for benchmarking"""
+
+# Import required modules
+import argparse
+import json
+import random
+import sys
+from collections import Counter, OrderedDict
+from catbridge_tools.isbn_tools import isbn_10_check_digit, isbn_13_check_digit
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+# ====================
+#     Constants
+# ====================
+
+
+# Records are encoded here rather than with catbridge_tools.Record,
+# so that the corpus does not depend on the code being benchmarked
+LEADER_LENGTH, DIRECTORY_LENGTH = 24, 12
+SUBFIELD_INDICATOR, END_OF_FIELD, END_OF_RECORD = b'\x1F', b'\x1E', b'\x1D'
+
+WORDS = ['the', 'of', 'and', 'history', 'library', 'british', 'catalogue', 'bridge', 'collected', 'works',
+         'london', 'science', 'journal', 'music', 'poems', 'letters', 'society', 'annual', 'report', 'new',
+         'english', 'studies', 'edition', 'volume', 'selected', 'papers', 'introduction', 'world', 'art', 'maps',
+         'café', 'Müller', 'naïve', 'São Paulo', 'Ελληνικά', 'Русский', '日本語']
+
+# The number of times each field occurs in a record is chosen uniformly between a minimum and a maximum
+FIELD_MIX = OrderedDict([
+    ('001', (1, 1)),
+    ('003', (1, 1)),
+    ('005', (1, 1)),
+    ('008', (1, 1)),
+    ('020', (0, 3)),
+    ('022', (0, 1)),
+    ('035', (0, 2)),
+    ('040', (1, 1)),
+    ('100', (0, 1)),
+    ('245', (1, 1)),
+    ('260', (0, 1)),
+    ('300', (1, 1)),
+    ('500', (0, 3)),
+    ('650', (0, 6)),
+    ('700', (0, 4)),
+    ('FMT', (1, 1)),
+])
+
+
+# ====================
+#      Functions
+# ====================
+
+
+def words(rng: random.Random, low: int = 1, high: int = 6) -> str:
+    """Function to generate a string of random words"""
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def isbn(rng: random.Random) -> str:
+    """Function to generate a valid ISBN, in 10- or 13-digit form, sometimes hyphenated"""
+    nine_digits = ''.join(rng.choice('0123456789') for _ in range(9))
+    if rng.random() < 0.5:
+        s = nine_digits + isbn_10_check_digit(nine_digits)
+    else:
+        s = '978' + nine_digits + isbn_13_check_digit('978' + nine_digits)
+    if rng.random() < 0.2:
+        s = '-'.join((s[:-8], s[-8:-4], s[-4:-1], s[-1]))
+    return s
+
+
+def control_field(rng: random.Random, tag: str, record_number: int) -> str:
+    """Function to generate the contents of a control field"""
+    if tag == '001':
+        return '%09d' % record_number
+    if tag == '003':
+        return 'Uk'
+    if tag == '005':
+        return '20%02d%02d%02d%06d.0' % (rng.randint(0, 26), rng.randint(1, 12), rng.randint(1, 28),
+                                        rng.randint(0, 235959))
+    if tag == '008':
+        return '%06ds%04d    enk           000 0 eng d' % (rng.randint(0, 999999), rng.randint(1800, 2026))
+    if tag == 'FMT':
+        return rng.choice(['BK', 'SE', 'MU', 'MP'])
+    return words(rng)
+
+
+def data_field(rng: random.Random, tag: str) -> (str, list):
+    """Function to generate the indicators and subfields of a data field"""
+    if tag == '020':
+        subfields = [('a', isbn(rng))]
+        if rng.random() < 0.3:
+            subfields.append(('q', rng.choice(['hardback', 'paperback', 'ebook'])))
+        return '##', subfields
+    if tag == '022':
+        return '0#', [('a', '%04d-%03d%s' % (rng.randint(0, 9999), rng.randint(0, 999), rng.choice('0123456789X')))]
+    if tag == '035':
+        return '##', [('a', f'(OCoLC){rng.randint(1, 10 ** 9)}')]
+    if tag == '040':
+        return '##', [('a', 'Uk'), ('b', 'eng'), ('c', 'Uk'), ('e', 'rda')]
+    if tag in ('100', '700'):
+        return '1#', [('a', f'{words(rng, 1, 1).title()}, {words(rng, 1, 2).title()},'),
+                      ('d', f'{rng.randint(1800, 1990)}-')]
+    if tag == '245':
+        return f'{rng.randint(0, 1)}0', [('a', words(rng, 2, 8) + ' :'), ('b', words(rng) + ' /'),
+                                         ('c', words(rng, 2, 4) + '.')]
+    if tag == '260':
+        return '##', [('a', 'London :'), ('b', words(rng, 1, 3) + ','), ('c', str(rng.randint(1800, 2026)) + '.')]
+    if tag == '300':
+        return '##', [('a', f'{rng.randint(10, 900)} pages :'), ('b', 'illustrations ;'), ('c', '24 cm')]
+    if tag == '650':
+        return f'#{rng.choice("07")}', [('a', words(rng, 1, 3).capitalize()), ('x', words(rng, 1, 2).capitalize()),
+                                        ('0', f'fst{rng.randint(0, 99999999):08d}')]
+    return rng.choice(['##', '0#', '10']), [('a', words(rng, 3, 20))]
+
+
+def encode_record(fields: list, status: str = 'n') -> bytes:
+    """Function to encode a record as MARC 21, given a list of (tag, data) tuples
+    where data is the encoded field excluding its END_OF_FIELD byte"""
+    directory, body, offset = [], [], 0
+    for tag, data in fields:
+        data += END_OF_FIELD
+        directory.append(b'%3s%04d%05d' % (tag.encode('ascii'), len(data), offset))
+        body.append(data)
+        offset += len(data)
+    directory.append(END_OF_FIELD)
+    directory = b''.join(directory)
+    base_address = LEADER_LENGTH + len(directory)
+    record_length = base_address + offset + len(END_OF_RECORD)
+    leader = b'%05d%sam a22%05d i 4500' % (record_length, status.encode('ascii'), base_address)
+    return b''.join([leader, directory] + body + [END_OF_RECORD])
+
+
+def generate_record(rng: random.Random, record_number: int, field_mix: dict = None) -> bytes:
+    """Function to generate a single synthetic record"""
+    fields = []
+    for tag, (low, high) in (field_mix or FIELD_MIX).items():
+        for _ in range(rng.randint(low, high)):
+            if (tag < '010' and tag.isdigit()) or tag == 'FMT':
+                fields.append((tag, control_field(rng, tag, record_number).encode('utf-8')))
+            else:
+                indicators, subfields = data_field(rng, tag)
+                data = indicators.replace('#', ' ').encode('ascii') + b''.join(
+                    SUBFIELD_INDICATOR + code.encode('ascii') + value.encode('utf-8') for code, value in subfields)
+                fields.append((tag, data))
+    return encode_record(fields)
+
+
+# ====================
+#   Error injection
+# ====================
+
+
+# Each function takes a valid record and returns it with one kind of structural error,
+# matching the checks made by MARCReaderTentative and RecordTentative.decode_marc
+
+
+def base_address(record: bytes) -> int:
+    return int(record[12:17])
+
+
+def error_record_length(rng: random.Random, record: bytes) -> bytes:
+    """The record length in the first 5 bytes does not match the actual length"""
+    return b'%05d' % (len(record) - rng.randint(1, 10)) + record[5:]
+
+
+def error_leader(rng: random.Random, record: bytes) -> bytes:
+    """The leader contains a byte which is not ASCII"""
+    position = rng.choice([5, 6, 7, 8, 17, 18, 19])
+    return record[:position] + b'\xff' + record[position + 1:]
+
+
+def error_base_address(rng: random.Random, record: bytes) -> bytes:
+    """The base address is beyond the end of the record"""
+    return record[:12] + b'%05d' % (len(record) + rng.randint(0, 100)) + record[17:]
+
+
+def error_directory_length(rng: random.Random, record: bytes) -> bytes:
+    """The length of the directory is not a multiple of 12"""
+    address = base_address(record)
+    record = record[:address - 1] + b'0' + record[address - 1:]
+    return b'%05d' % len(record) + record[5:12] + b'%05d' % (address + 1) + record[17:]
+
+
+def error_directory_terminator(rng: random.Random, record: bytes) -> bytes:
+    """The directory does not end with an end-of-field character"""
+    address = base_address(record)
+    return record[:address - 1] + b' ' + record[address:]
+
+
+def field_positions(record: bytes) -> list:
+    """Function to get the (start, end) positions of each field, including its END_OF_FIELD byte"""
+    address = base_address(record)
+    positions = []
+    for entry_start in range(LEADER_LENGTH, address - 1, DIRECTORY_LENGTH):
+        entry = record[entry_start:entry_start + DIRECTORY_LENGTH]
+        start = address + int(entry[7:12])
+        positions.append((start, start + int(entry[3:7])))
+    return positions
+
+
+def error_field_terminator(rng: random.Random, record: bytes) -> bytes:
+    """A field does not end with an end-of-field character"""
+    start, end = rng.choice(field_positions(record))
+    return record[:end - 1] + b' ' + record[end:]
+
+
+def error_field_content(rng: random.Random, record: bytes) -> bytes:
+    """A field contains an unexpected end-of-field character"""
+    start, end = rng.choice([p for p in field_positions(record) if p[1] - p[0] > 2])
+    position = rng.randint(start, end - 2)
+    return record[:position] + END_OF_FIELD + record[position + 1:]
+
+
+def error_no_fields(rng: random.Random, record: bytes) -> bytes:
+    """The record does not contain any fields"""
+    return encode_record([])
+
+
+ERRORS = OrderedDict([
+    ('record_length', error_record_length),
+    ('leader', error_leader),
+    ('base_address', error_base_address),
+    ('directory_length', error_directory_length),
+    ('directory_terminator', error_directory_terminator),
+    ('field_terminator', error_field_terminator),
+    ('field_content', error_field_content),
+    ('no_fields', error_no_fields),
+])
+
+
+def generate_corpus(path_to_file: str, records: int = 10000, seed: int = 0, field_mix: dict = None,
+                    error_rate: float = 0.0, errors: list = None) -> dict:
+    """Function to write a file of synthetic records.
+
+    The same seed, number of records, field mix and error settings always produce the same file.
+    Each record has probability error_rate of containing one structural error, chosen from errors
+    (by default, all of the kinds in ERRORS).
+    Returns a summary of the file, including the number of errors of each kind"""
+    rng = random.Random(seed)
+    errors = list(errors or ERRORS)
+    for e in errors:
+        if e not in ERRORS:
+            raise ValueError(f'Unknown error type {e}: choose from {", ".join(ERRORS)}')
+    injected, size = Counter(), 0
+    with open(path_to_file, mode='wb') as ofile:
+        for record_number in range(1, records + 1):
+            record = generate_record(rng, record_number, field_mix)
+            if error_rate and rng.random() < error_rate:
+                e = rng.choice(errors)
+                record = ERRORS[e](rng, record)
+                injected[e] += 1
+            ofile.write(record)
+            size += len(record)
+    return {
+        'path': path_to_file,
+        'records': records,
+        'bytes': size,
+        'seed': seed,
+        'errors': dict(injected),
+    }
+
+
+def parse_field_mix(s: str) -> dict:
+    """Function to parse a field mix such as 650=0-10,700=2 and apply it to the default mix.
+    Tags set to 0 are removed"""
+    field_mix = OrderedDict(FIELD_MIX)
+    for item in s.split(','):
+        tag, counts = item.strip().split('=')
+        low, _, high = counts.partition('-')
+        field_mix[tag] = (int(low), int(high or low))
+        if field_mix[tag] == (0, 0):
+            del field_mix[tag]
+    return field_mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a file of synthetic MARC records for benchmarking')
+    parser.add_argument('-o', metavar='<output_file>', required=True, action='store', type=str,
+                        help='path to output file')
+    parser.add_argument('--records', metavar='<n>', required=False, action='store', type=int, default=10000,
+                        help='Number of records to generate (default 10000)')
+    parser.add_argument('--seed', metavar='<n>', required=False, action='store', type=int, default=0,
+                        help='Seed for the random number generator (default 0)')
+    parser.add_argument('--mix', metavar='<tag=min-max,...>', required=False, action='store', type=str,
+                        help='Number of occurrences of each field, added to or replacing the default mix')
+    parser.add_argument('--errors', metavar='<rate>', required=False, action='store', type=float, default=0.0,
+                        help='Proportion of records which contain a structural error (default 0)')
+    parser.add_argument('--error-types', metavar='<type,...>', required=False, action='store', type=str,
+                        help=f'Kinds of error to inject (default all): {", ".join(ERRORS)}')
+    args = parser.parse_args(argv)
+
+    summary = generate_corpus(args.o, records=args.records, seed=args.seed,
+                              field_mix=parse_field_mix(args.mix) if args.mix else None,
+                              error_rate=args.errors,
+                              errors=args.error_types.split(',') if args.error_types else None)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
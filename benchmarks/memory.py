@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Script to measure the memory used to hold decoded MARC records"""
+
+# Import required modules
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from benchmarks.corpus import generate_corpus
+from catbridge_tools.marc_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+# ====================
+#      Functions
+# ====================
+
+
+def measure(path_to_file: str, lazy: bool = False, limit: int = None) -> dict:
+    """Function to read the records in a file into a list, and measure the memory allocated to hold them.
+    If lazy is True, every field is decoded so that the records are complete"""
+    reader = MARCReader(path_to_file, lazy=lazy)
+    reader.silent = True
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = []
+    for record in reader:
+        if lazy:
+            record.fields
+        records.append(record)
+        if limit and len(records) >= limit:
+            break
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    reader.close()
+    total_fields = sum(len(record.fields) for record in records)
+    return {
+        'records': len(records),
+        'fields': total_fields,
+        'bytes': size,
+        'bytes_per_record': size / max(len(records), 1),
+        'bytes_per_field': size / max(total_fields, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the memory used to hold decoded MARC records')
+    parser.add_argument('-i', metavar='<input_file>', required=False, action='store', type=str,
+                        help='File of MARC records to use instead of a generated corpus')
+    parser.add_argument('--records', metavar='<n>', required=False, action='store', type=int, default=10000,
+                        help='Number of records in the generated corpus (default 10000)')
+    parser.add_argument('--seed', metavar='<n>', required=False, action='store', type=int, default=0,
+                        help='Seed for the generated corpus (default 0)')
+    parser.add_argument('--limit', metavar='<n>', required=False, action='store', type=int, default=None,
+                        help='Maximum number of records to read')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as working_directory:
+        input_file = args.i
+        if not input_file:
+            input_file = os.path.join(working_directory, 'clean.lex')
+            generate_corpus(input_file, records=args.records, seed=args.seed)
+        for lazy in (False, True):
+            result = measure(input_file, lazy=lazy, limit=args.limit)
+            print(f'{"LazyRecord" if lazy else "Record":<12}{result["records"]:>10} records'
+                  f'{result["bytes_per_record"]:>12.0f} bytes/record{result["bytes_per_field"]:>10.0f} bytes/field')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Script to time the MARC reading and writing classes and the command-line utilities.
+
+Results are written as JSON, with the throughput of each benchmark in records/s and MB/s"""
+
+# Import required modules
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from benchmarks.corpus import generate_corpus
+from catbridge_tools.marc_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+# ====================
+#     Constants
+# ====================
+
+
+BIN_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin')
+
+CN_FIND_CONFIG = '=001\tBL001\n=020  **$a\tISBN\n=022  **$a\tISSN\n=035  **$a\tOCLC\n=650  *7$0\tFAST\n'
+KEEP_FLD_CONFIG = '=001\n=008  ^[0-9]{6}\n=020  **$a\n=245  1*\n=650  *0$a.*[A-Z].*$x\n=300  ##$a.*p\n'
+
+
+# ====================
+#      Functions
+# ====================
+
+
+def load_script(name: str):
+    """Function to import one of the command-line utilities from the bin directory"""
+    spec = importlib.util.spec_from_file_location(f'catbridge_bin_{name}', os.path.join(BIN_DIRECTORY, f'{name}.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_script(name: str, *argv: str):
+    """Function to run one of the command-line utilities as if from the command line.
+    The utilities read their arguments from sys.argv, and exit with SystemExit when they finish"""
+    module = load_script(name)
+    saved_argv = sys.argv
+    sys.argv = [name] + list(argv)
+    try:
+        module.main(list(argv))
+    except SystemExit as err:
+        if err.code not in (None, 0):
+            raise
+    finally:
+        sys.argv = saved_argv
+
+
+def read_raw(path_to_file: str) -> list:
+    """Function to read the undecoded records in a file"""
+    reader = MARCReader(path_to_file)
+    reader.silent = True
+    records = []
+    marc = reader.read_marc()
+    while marc:
+        records.append(bytes(marc))
+        marc = reader.read_marc()
+    reader.close()
+    return records
+
+
+class Benchmarks:
+    """Benchmarks to run against a clean corpus and a corpus containing structural errors.
+
+    Each benchmark method does some work, and returns the number of records and bytes it processed.
+    Work which is not being measured, such as reading the records to be encoded, is done in prepare_ methods"""
+
+    def __init__(self, clean_file: str, errors_file: str, working_directory: str):
+        self.clean_file = clean_file
+        self.errors_file = errors_file
+        self.working_directory = working_directory
+        self.clean_size = os.path.getsize(clean_file)
+        self.errors_size = os.path.getsize(errors_file)
+        self.raw, self.records, self.modified = [], [], []
+        self.counts = {}
+
+    def names(self) -> list:
+        return [name[len('bench_'):] for name in dir(self) if name.startswith('bench_')]
+
+    def working_copy(self, path_to_file: str) -> str:
+        """Function to copy a corpus into the working directory, so that output files are written there"""
+        path = os.path.join(self.working_directory, os.path.basename(path_to_file))
+        if not os.path.isfile(path):
+            with open(path_to_file, mode='rb') as ifile, open(path, mode='wb') as ofile:
+                ofile.write(ifile.read())
+        return path
+
+    def prepare_decode_marc(self):
+        self.raw = self.raw or read_raw(self.clean_file)
+
+    def prepare_as_marc(self):
+        self.prepare_decode_marc()
+        self.records = self.records or [Record(marc) for marc in self.raw]
+
+    def prepare_as_marc_encode(self):
+        self.prepare_as_marc()
+        if not self.modified:
+            # Copies of the records with no raw data, so that every field must be encoded
+            for record in self.records:
+                output_record = Record(leader=record.leader)
+                for field in record:
+                    if field.is_control_field():
+                        output_record.add_field(Field(tag=field.tag, data=field.data))
+                    else:
+                        output_record.add_field(Field(tag=field.tag, indicators=field.indicators,
+                                                      subfields=field.subfields))
+                self.modified.append(output_record)
+
+    prepare_marc_writer = prepare_as_marc
+
+    def bench_marc_reader(self):
+        reader = MARCReader(self.clean_file)
+        reader.silent = True
+        count = sum(1 for _ in reader)
+        reader.close()
+        return count, self.clean_size
+
+    def bench_marc_reader_lazy(self):
+        reader = MARCReader(self.clean_file, lazy=True)
+        reader.silent = True
+        count = sum(1 for _ in reader)
+        reader.close()
+        return count, self.clean_size
+
+    def bench_marc_reader_read_marc(self):
+        reader = MARCReader(self.clean_file)
+        reader.silent = True
+        count = 0
+        while reader.read_marc():
+            count += 1
+        reader.close()
+        return count, self.clean_size
+
+    def bench_marc_reader_tentative(self):
+        reader = MARCReaderTentative(self.errors_file)
+        reader.silent = True
+        count = sum(1 for _ in reader)
+        reader.close()
+        return count, self.errors_size
+
+    def bench_decode_marc(self):
+        for marc in self.raw:
+            Record(marc)
+        return len(self.raw), self.clean_size
+
+    def bench_as_marc(self):
+        size = sum(len(record.as_marc()) for record in self.records)
+        return len(self.records), size
+
+    def bench_as_marc_encode(self):
+        size = sum(len(record.as_marc()) for record in self.modified)
+        return len(self.modified), size
+
+    def bench_marc_writer(self):
+        writer = MARCWriter(os.path.join(self.working_directory, 'writer.lex'))
+        writer.silent = True
+        for record in self.records:
+            writer.write(record)
+        writer.close()
+        return len(self.records), self.clean_size
+
+    def bench_cn_find(self):
+        config = os.path.join(self.working_directory, 'cn_find.cfg')
+        with open(config, mode='w', encoding='utf-8') as cfile:
+            cfile.write(CN_FIND_CONFIG)
+        run_script('cn_find', '-i', self.clean_file, '-o', os.path.join(self.working_directory, 'cn_find.txt'),
+                   '-c', config, '--tidy')
+        return None, self.clean_size
+
+    def bench_keep_fld(self):
+        config = os.path.join(self.working_directory, 'keep_fld.cfg')
+        with open(config, mode='w', encoding='utf-8') as cfile:
+            cfile.write(KEEP_FLD_CONFIG)
+        run_script('keep_fld', '-i', self.working_copy(self.clean_file), '-c', config)
+        return None, self.clean_size
+
+    def bench_fix_fmt(self):
+        run_script('fix_fmt', '-i', self.working_copy(self.clean_file))
+        return None, self.clean_size
+
+    def bench_marc_check(self):
+        run_script('marc_check', '-i', self.working_copy(self.errors_file))
+        return None, self.errors_size
+
+    def bench_pipeline(self):
+        keep_config = os.path.join(self.working_directory, 'keep_fld.cfg')
+        cn_config = os.path.join(self.working_directory, 'cn_find.cfg')
+        with open(keep_config, mode='w', encoding='utf-8') as cfile:
+            cfile.write(KEEP_FLD_CONFIG)
+        with open(cn_config, mode='w', encoding='utf-8') as cfile:
+            cfile.write(CN_FIND_CONFIG)
+        run_script('pipeline', '-i', self.working_copy(self.errors_file), '-s', 'check', 'fix_fmt', 'keep_fld',
+                   'cn_find', '--keep-config', keep_config, '--cn-config', cn_config,
+                   '--cn-output', os.path.join(self.working_directory, 'pipeline.txt'), '--tidy')
+        return None, self.errors_size
+
+    def run(self, name: str, repeat: int = 3) -> dict:
+        """Function to run a benchmark repeat times, and report the fastest run"""
+        prepare = getattr(self, f'prepare_{name}', None)
+        if prepare:
+            prepare()
+        benchmark = getattr(self, f'bench_{name}')
+        times = []
+        for _ in range(repeat):
+            with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                count, size = benchmark()
+                times.append(time.perf_counter() - start)
+        seconds = min(times)
+        if count is None:
+            # The utilities process every record in the corpus
+            count = self.records_in(self.errors_file if name in ('marc_check', 'pipeline') else self.clean_file)
+        return OrderedDict([
+            ('name', name),
+            ('records', count),
+            ('bytes', size),
+            ('seconds', round(seconds, 6)),
+            ('times', [round(t, 6) for t in times]),
+            ('records_per_second', round(count / seconds, 1)),
+            ('mb_per_second', round(size / seconds / 2 ** 20, 3)),
+        ])
+
+    def records_in(self, path_to_file: str) -> int:
+        """Function to count the records in a file, as read by MARCReaderTentative,
+        since the corpus for marc_check contains records with incorrect lengths"""
+        if path_to_file not in self.counts:
+            reader = MARCReaderTentative(path_to_file)
+            reader.silent = True
+            self.counts[path_to_file] = sum(1 for _ in reader)
+            reader.close()
+        return self.counts[path_to_file]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the MARC reading and writing classes and utilities')
+    parser.add_argument('-i', metavar='<input_file>', required=False, action='store', type=str,
+                        help='Clean file of MARC records to use instead of a generated corpus')
+    parser.add_argument('-o', metavar='<output_file>', required=False, action='store', type=str,
+                        help='Path to write the JSON results to (default standard output)')
+    parser.add_argument('--records', metavar='<n>', required=False, action='store', type=int, default=10000,
+                        help='Number of records in the generated corpus (default 10000)')
+    parser.add_argument('--seed', metavar='<n>', required=False, action='store', type=int, default=0,
+                        help='Seed for the generated corpus (default 0)')
+    parser.add_argument('--errors', metavar='<rate>', required=False, action='store', type=float, default=0.01,
+                        help='Proportion of records with structural errors in the corpus for marc_check '
+                             'and MARCReaderTentative (default 0.01)')
+    parser.add_argument('--repeat', metavar='<n>', required=False, action='store', type=int, default=3,
+                        help='Number of times to run each benchmark; the fastest run is reported (default 3)')
+    parser.add_argument('--only', metavar='<name,...>', required=False, action='store', type=str,
+                        help='Comma-separated list of the benchmarks to run (default all)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as working_directory:
+        corpus = {}
+        if args.i:
+            clean_file = args.i
+            corpus['clean'] = {'path': clean_file, 'bytes': os.path.getsize(clean_file)}
+        else:
+            clean_file = os.path.join(working_directory, 'clean.lex')
+            corpus['clean'] = generate_corpus(clean_file, records=args.records, seed=args.seed)
+        errors_file = os.path.join(working_directory, 'errors.lex')
+        corpus['errors'] = generate_corpus(errors_file, records=args.records, seed=args.seed, error_rate=args.errors)
+
+        benchmarks = Benchmarks(clean_file, errors_file, working_directory)
+        names = args.only.split(',') if args.only else benchmarks.names()
+        for name in names:
+            if name not in benchmarks.names():
+                parser.error(f'Unknown benchmark {name}: choose from {", ".join(benchmarks.names())}')
+
+        results = []
+        for name in names:
+            results.append(benchmarks.run(name, repeat=args.repeat))
+            print(f'{name:<28}{results[-1]["records_per_second"]:>14.1f} records/s'
+                  f'{results[-1]["mb_per_second"]:>10.3f} MB/s', file=sys.stderr)
+
+    report = OrderedDict([
+        ('date', datetime.datetime.now().isoformat(timespec='seconds')),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('corpus', corpus),
+        ('results', results),
+    ])
+    if args.o:
+        with open(args.o, mode='w', encoding='utf-8') as ofile:
+            json.dump(report, ofile, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""Script to build an index of the control numbers in one or more file(s) of MARC records"""
+
+from catbridge_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+NAME = 'cn_index'
+SUMMARY = 'A utility to build an index of the control numbers in specified fields and subfields ' \
+          'within one or more file(s) of MARC records, for use with marc_match.'
+
+
+def main(argv=None):
+
+    if argv is None:
+        name = str(sys.argv[1])
+
+    cb = CatBridge(NAME, SUMMARY, ['i+', 'o', 'c'])
+    cb.parser.add_argument('--conv', required=False, action='store_true',
+                           help='Convert 10-digit ISBNs to 13-digit form where possible')
+    cb.parser.add_argument('--rebuild', required=False, action='store_true',
+                           help='Build the index again from the beginning, rather than updating it')
+    args = cb.parse_args(argv)
+
+    check_file_location(args.c[0], 'config file')
+    date_time_message(f'Reading config file from {str(args.c[0])}')
+    rules = ControlNumberRules(args.c[0])
+    logging.info(f'Search target: {repr(rules)}')
+    if args.conv:
+        logging.info('Converting ISBN-10 to ISBN-13')
+
+    date_time_message(f'Opening index {str(args.o[0])}')
+    index = ControlNumberIndex(args.o[0])
+    if args.rebuild:
+        index.clear()
+    index.configure(rules, convert=args.conv)
+
+    files = []
+    for file in input_files(args.i):
+        state, start = index.file_state(file)
+        if state == 'unchanged':
+            log_print(f'File {os.path.basename(file)} has already been indexed')
+            continue
+        if state == 'appended':
+            log_print(f'Records have been added to file {os.path.basename(file)} since it was indexed')
+        elif state == 'changed':
+            log_print(f'File {os.path.basename(file)} has changed since it was indexed')
+        files.append((file, start))
+
+    if files:
+        # As in marc_db, the records of changed files are deleted while the indexes are available,
+        # and the indexes are created again after all the records are indexed
+        for file, start in files:
+            if start == 0:
+                index.delete_file(file)
+        index.drop_indexes()
+        for file, start in files:
+            date_time_message(f'Indexing file {str(file)}')
+            total = index.index(file, start)
+            log_print(f'{str(total)} records indexed from file {os.path.basename(file)}')
+        date_time_message('Creating indexes')
+    index.create_indexes()
+    log_print(f'Index {str(args.o[0])} contains {str(len(index))} records')
+    index.close()
+
+    date_time_exit()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -25,26 +25,15 @@ def main(argv=None):
     args = cb.parse_args(argv)
     total = 0
 
-    for a in args.i:
-        file_list = glob.glob(a)
-        for file in file_list:
-            if not os.path.isfile(file):
-                raise CBError(f'Error: Could not locate {str(file)}')
-            date_time_message(f'Reading file {str(file)}')
-            reader = MARCReader(file)
-            head, tail = os.path.split(file)
-            writer = MARCWriter(os.path.join(head, f'fix-{tail}'))
-            for record in reader:
-                output_record = Record(leader=record.leader)
-                for field in record:
-                    if field.tag == 'FMT' and hasattr(field, 'data'):
-                        output_record.add_field(Field(tag='FMT', indicators=[' ', ' '], subfields=['a', field.data]))
-                    else:
-                        output_record.add_field(field)
-                writer.write(output_record)
-
-            writer.close()
-            reader.close()
+    for file in input_files(args.i):
+        date_time_message(f'Reading file {str(file)}')
+        reader = MARCReader(file, lazy=True)
+        writer = MARCWriter(output_path(file, prefix='fix-'))
+        for record in reader:
+            writer.write(fix_fmt(record))
+
+        writer.close()
+        reader.close()
     date_time_exit()
 
 
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
 
-"""Script to count the number of records present within one or more file(s) of MARC records"""
+"""Script to check the structural validity of MARC records, and isolate those found to be flawed"""
 
 from catbridge_tools import *
 
@@ -15,38 +15,80 @@ NAME = 'marc_check'
 SUMMARY = 'A utility a to check the structural validity MARC records, and isolate those found to be flawed.'
 
 
+def check_file(file, results):
+    """Function to write the results of checking a file, given as (status, error, data) tuples,
+    to the files of valid and flawed records"""
+    print('\n')
+    log_print(f'Checking file {os.path.basename(file)}')
+    file_errors, file_records = 0, 0
+    writer = MARCWriter(output_path(file, suffix='_ok'))
+    efile = open_file(output_path(file, suffix='_f', extension='.lex', default='stdin_f.lex'), mode='wb')
+
+    # Records which pass the checks are written without being decoded
+    for status, error, data in results:
+        file_records += 1
+        if not status:
+            file_errors += 1
+            log_print(f'Error at record {str(file_records)}: {error}')
+            efile.write(data)
+        else:
+            writer.write_marc(data)
+    efile.close()
+    writer.close()
+    log_print(f'File {os.path.basename(file)} contains {str(file_errors)} flawed records')
+    log_print(f'100% [{str(file_records)} records] processed')
+
+
+def read_file(file):
+    """Generator to check the records in a file one at a time"""
+    reader = MARCReaderTentative(file)
+    reader.silent = True
+    while True:
+        try:
+            yield reader.next_tentative()
+        except StopIteration:
+            break
+    reader.close()
+
+
+def read_files_parallel(files, workers):
+    """Generator to check the records in a batch of files using a pool of processes.
+    Yields a (file, results) tuple for each file, where results is a generator of (status, error, data) tuples"""
+    results = check_records_parallel(*files, workers=workers)
+    result = next(results, None)
+
+    def file_results(file):
+        nonlocal result
+        while result is not None and result[0] == file:
+            yield result[1:]
+            result = next(results, None)
+
+    for file in files:
+        yield file, file_results(file)
+
+
 def main(argv=None):
 
     if argv is None:
         name = str(sys.argv[1])
 
     cb = CatBridge(NAME, SUMMARY, ['i+', ])
+    cb.parser.add_argument('--workers', metavar='<n>', required=False, action='store', type=int, default=1,
+                           help='Number of processes to use to check the files (default 1)')
     args = cb.parse_args(argv)
 
-    for a in args.i:
-        file_list = glob.glob(a)
-        for file in file_list:
-            if not os.path.isfile(file):
-                raise CBError(f'Error: Could not locate {str(file)}')
-            print('\n')
-            log_print(f'Checking file {os.path.basename(file)}')
-            file_errors = 0
-            reader = MARCReaderTentative(file)
-            fname, ext = os.path.splitext(file)
-            writer = MARCWriter(f'{fname}_ok{ext}')
-            efile = open(f'{fname}_f.lex', mode='wb')
-
-            for status, message, record in reader:
-                file_errors += not int(status)
-                if not status:
-                    log_print(message)
-                    efile.write(record)
-                else:
-                    writer.write(record)
-            efile.close()
-            writer.close()
-            log_print(f'File {os.path.basename(file)} contains {str(file_errors)} flawed records')
-            reader.close()
+    files = input_files(args.i)
+
+    # Files are divided into chunks by offset, so streams and compressed files are checked by a single process
+    if args.workers > 1 and all(file_size(file) is not None for file in files):
+        # Each file is checked once, since results are matched to files by name
+        for file, results in read_files_parallel(list(OrderedDict.fromkeys(files)), args.workers):
+            check_file(file, results)
+    else:
+        if args.workers > 1:
+            log_print('Standard input and compressed files are checked by a single process')
+        for file in files:
+            check_file(file, read_file(file))
 
     date_time_exit()
 
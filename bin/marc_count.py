@@ -21,19 +21,24 @@ def main(argv=None):
         name = str(sys.argv[1])
 
     cb = CatBridge(NAME, SUMMARY, ['i+', ])
+    cb.parser.add_argument('--verify', required=False, action='store_true',
+                           help='Check that each record ends with an end-of-record character')
     args = cb.parse_args(argv)
     total = 0
 
-    for a in args.i:
-        file_list = glob.glob(a)
-        for file in file_list:
-            if not os.path.isfile(file):
-                raise CBError(f'Error: Could not locate {str(file)}')
-            reader = MARCReader(file)
-            file_total = len(reader)
-            total += file_total
-            log_print(f'File {os.path.basename(file)} contains {str(file_total)} records ')
-            reader.close()
+    for file in input_files(args.i):
+        reader = MARCReader(file)
+        reader.silent = True
+        start = time.perf_counter()
+        try:
+            file_total = reader.count_records(check_terminator=args.verify)
+        except RecordLengthError as err:
+            raise CBError(f'Error reading file {os.path.basename(file)}: {err}')
+        if reader.metrics is not None:
+            reader.metrics.add('read', time.perf_counter() - start, records=file_total, size=reader.__sizeof__())
+        total += file_total
+        log_print(f'File {os.path.basename(file)} contains {str(file_total)} records ')
+        reader.close()
     print(f'Total number of records read: {str(total)}')
     date_time_exit()
 
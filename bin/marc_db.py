@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""Script to load one or more file(s) of MARC records into an SQLite database"""
+
+from catbridge_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+NAME = 'marc_db'
+SUMMARY = 'A utility to load MARC records into an SQLite database of records, fields and subfields.'
+
+
+def main(argv=None):
+
+    if argv is None:
+        name = str(sys.argv[1])
+
+    cb = CatBridge(NAME, SUMMARY, ['i+', 'o'])
+    cb.parser.add_argument('--reload', required=False, action='store_true',
+                           help='Load files again even if they have not changed since they were last loaded')
+    args = cb.parse_args(argv)
+
+    date_time_message(f'Opening database {str(args.o[0])}')
+    db = MARCDatabase(args.o[0])
+    files = []
+    for file in input_files(args.i):
+        if args.reload or not db.is_loaded(file):
+            files.append(file)
+        else:
+            log_print(f'File {os.path.basename(file)} has already been loaded')
+
+    if files:
+        # Indexes are created after all the records are loaded, which is much faster than updating them as rows are
+        # inserted; the old rows of files which have changed are deleted first, while the indexes are available
+        for file in files:
+            db.delete_file(file)
+        db.drop_indexes()
+        for file in files:
+            date_time_message(f'Loading file {str(file)}')
+            total = db.load(file)
+            log_print(f'File {os.path.basename(file)} contains {str(total)} records')
+        date_time_message('Creating indexes')
+    db.create_indexes()
+    db.close()
+
+    date_time_exit()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
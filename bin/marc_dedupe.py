@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""Script to remove duplicate records from one or more file(s) of MARC records"""
+
+from catbridge_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+NAME = 'marc_dedupe'
+SUMMARY = 'A utility to remove duplicate records from one or more file(s) of MARC records.'
+
+
+def main(argv=None):
+
+    if argv is None:
+        name = str(sys.argv[1])
+
+    cb = CatBridge(NAME, SUMMARY, ['i+', 'o'])
+    cb.parser.add_argument('--key', required=False, action='store', type=str, default='001',
+                           choices=list(DEDUPLICATION_KEYS),
+                           help='Key by which duplicates are identified: record ID in field 001, '
+                                'first valid ISBN in field 020, or hash of the complete record (default 001)')
+    cb.parser.add_argument('--expected', metavar='<n>', required=False, action='store', type=int, default=10 ** 7,
+                           help='Expected number of records, used to size the filter held in memory (default 10000000)')
+    cb.parser.add_argument('--keys', metavar='<keys_file>', required=False, action='store', type=str,
+                           help='Keep the keys seen in <keys_file>, so that records seen in earlier runs are also removed')
+    args = cb.parse_args(argv)
+
+    get_key = DEDUPLICATION_KEYS[args.key]
+    logging.info(f'Identifying duplicates by {args.key}')
+    keys = KeyStore(args.keys, capacity=args.expected)
+
+    # The first record with each key is written to the output file, and later records with the same key
+    # to a file with the prefix dp-; records without a key are never treated as duplicates
+    writer = MARCWriter(args.o[0])
+    dwriter = MARCWriter(output_path(args.o[0], prefix='dp-', default='dp-stdout.lex'))
+    total, duplicates, missing = 0, 0, 0
+
+    for file in input_files(args.i):
+        date_time_message(f'Reading file {str(file)}')
+        reader = MARCReader(file, lazy=True)
+        for record in reader:
+            key = get_key(record)
+            if key is None:
+                missing += 1
+                writer.write(record)
+            elif keys.add(key):
+                duplicates += 1
+                dwriter.write(record)
+            else:
+                writer.write(record)
+        reader.close()
+        total += reader.count
+
+    writer.close()
+    dwriter.close()
+    keys.close()
+    log_print(f'{str(total)} records read: {str(duplicates)} duplicates removed')
+    if missing:
+        log_print(f'{str(missing)} records have no {args.key} key, and were not checked for duplicates')
+    date_time_exit()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
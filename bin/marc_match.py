@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""Script to find the records containing a list of control numbers, using an index built by cn_index"""
+
+from catbridge_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+NAME = 'marc_match'
+SUMMARY = 'A utility to find the records containing a list of control numbers, using an index built by cn_index.'
+
+
+def main(argv=None):
+
+    if argv is None:
+        name = str(sys.argv[1])
+
+    cb = CatBridge(NAME, SUMMARY, ['i+', 'o'])
+    cb.parser.add_argument('--index', metavar='<index_file>', required=True, action='store', type=str,
+                           help='Path to index built by cn_index')
+    cb.parser.add_argument('--records', required=False, action='store_true',
+                           help='Write the matching records to the output file, rather than a list of record IDs')
+    args = cb.parse_args(argv)
+
+    if not os.path.isfile(args.index):
+        raise CBError(f'Error: Could not locate index file at {str(args.index)}')
+    date_time_message(f'Opening index {str(args.index)}')
+    index = ControlNumberIndex(args.index)
+    if index.rules is None:
+        raise CBError(f'Error: {str(args.index)} is not an index built by cn_index')
+    logging.info(f'Search target: {repr(index.rules)}')
+
+    # Offsets of records in files which have changed since they were indexed may no longer be correct
+    stale = index.stale_files()
+    for path in stale:
+        log_print(f'Warning: file {str(path)} has changed since it was indexed; run cn_index to update the index')
+    if stale and args.records:
+        raise CBError(f'Error: the index {str(args.index)} is out of date')
+
+    # Each line of the input file(s) is normalised by the rules used to build the index,
+    # so that e.g. ISBNs with hyphens match ISBNs without them.
+    # Lines which do not match any of the rules are looked up unchanged
+    queries, numbers = [], []
+    for file in input_files(args.i):
+        date_time_message(f'Reading file {str(file)}')
+        ifile = open_file(file, mode='r', encoding='utf-8', errors='replace')
+        for line in ifile:
+            line = line.strip()
+            if line:
+                found = index.rules.find_text(line, convert=index.convert) or [line]
+                queries.append((line, found))
+                numbers.extend(found)
+        ifile.close()
+    log_print(f'{str(len(queries))} control numbers read')
+
+    date_time_message('Searching index')
+    matches = OrderedDict()
+    for number, path, offset, length, record_id in index.match(numbers):
+        matches.setdefault(number, []).append((path, offset, length, record_id))
+    index.close()
+
+    if args.records:
+        # Each matching record is written once, in the order in which it is first matched
+        writer = MARCWriter(args.o[0])
+        readers, written = {}, set()
+        for number, records in matches.items():
+            for path, offset, length, record_id in records:
+                if (path, offset) in written:
+                    continue
+                written.add((path, offset))
+                if path not in readers:
+                    readers[path] = open_file(path, mode='rb')
+                readers[path].seek(offset)
+                writer.write_marc(readers[path].read(length))
+        for file_handle in readers.values():
+            file_handle.close()
+        writer.close()
+        log_print(f'{str(writer.count)} records written to {str(args.o[0])}')
+    else:
+        ofile = open_file(args.o[0], mode='w', encoding='utf-8', errors='replace')
+        for number, records in matches.items():
+            for path, offset, length, record_id in records:
+                ofile.write(f'{number}\t{record_id or ""}\t{path}\n')
+        ofile.close()
+
+    # Control numbers without any matching records are written to a file with the prefix nm-
+    unmatched = 0
+    nfile = open_file(output_path(args.o[0], prefix='nm-', extension='.txt', default='nm-stdout.txt'), mode='w',
+                      encoding='utf-8', errors='replace')
+    for line, found in queries:
+        if not any(number in matches for number in found):
+            unmatched += 1
+            nfile.write(f'{line}\n')
+    nfile.close()
+    log_print(f'{str(len(queries) - unmatched)} control numbers matched, {str(unmatched)} not matched')
+
+    date_time_exit()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
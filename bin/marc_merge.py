@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""Script to merge a file of updated MARC records into one or more file(s) of MARC records"""
+
+from catbridge_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+NAME = 'marc_merge'
+SUMMARY = 'A utility to merge a file of updated MARC records into one or more file(s) of MARC records, ' \
+          'replacing, adding or deleting records by record ID.'
+
+
+def main(argv=None):
+
+    if argv is None:
+        name = str(sys.argv[1])
+
+    cb = CatBridge(NAME, SUMMARY, ['i+', 'o'])
+    cb.parser.add_argument('-u', metavar='<update_file>', required=True, action='store', type=str,
+                           help='Path to file of updated records')
+    cb.parser.add_argument('--policy', required=False, action='store', type=str, default='replace',
+                           choices=list(MERGE_POLICIES),
+                           help='How records with the same record ID are merged: replace with the update, '
+                                'keep the newer version by field 005, or combine their fields, taking control fields '
+                                'and non-repeatable fields such as 245 from the update (default replace)')
+    args = cb.parse_args(argv)
+
+    check_file_location(args.u, 'update file')
+    merge = MERGE_POLICIES[args.policy]
+    logging.info(f'Merging records by {args.policy}')
+
+    # Only the offsets of the updated records are held in memory;
+    # the records themselves are read again as the records they update are reached
+    date_time_message(f'Reading update file {str(args.u)}')
+    updates = RecordMap(args.u)
+    log_print(f'File {os.path.basename(args.u)} contains {str(updates.count)} records '
+              f'with {str(len(updates))} record IDs')
+    if updates.unidentified:
+        log_print(f'{str(len(updates.unidentified))} records in {os.path.basename(args.u)} have no record ID, '
+                  f'and will be added without being merged')
+
+    writer = MARCWriter(args.o[0])
+    matched = set()
+    total, merged, deleted = 0, 0, 0
+
+    for file in input_files(args.i):
+        date_time_message(f'Reading file {str(file)}')
+        # Records are not decoded: only the record ID is read from records which are not updated,
+        # and they are written to the output file unchanged
+        reader = MARCReader(file)
+        reader.silent = True
+        file_total = 0
+        data = reader.read_marc()
+        while data is not None:
+            try:
+                record_id = get_control_field(data)
+            except (ValueError, UnicodeDecodeError):
+                logging.warning(f'Could not read record ID of record {str(file_total + 1)} in {str(file)}')
+                record_id = None
+            if record_id not in updates:
+                writer.write_marc(data)
+            else:
+                matched.add(record_id)
+                marc = merge_versions(data, updates.get(record_id), merge)
+                if marc is None:
+                    deleted += 1
+                else:
+                    merged += 1
+                    writer.write_marc(marc)
+            file_total += 1
+            data = reader.read_marc()
+        reader.close()
+        log_print(f'File {os.path.basename(file)} contains {str(file_total)} records')
+        total += file_total
+
+    # Records in the update file which do not update an existing record are added in the order in which they occur
+    date_time_message(f'Adding new records from {str(args.u)}')
+    added, ignored = 0, 0
+    for record_id in updates:
+        if record_id in matched:
+            continue
+        marc = merge_versions(None, updates.get(record_id), merge)
+        if marc is None:
+            ignored += 1
+        else:
+            added += 1
+            writer.write_marc(marc)
+    for offset in updates.unidentified:
+        marc = updates.read(offset)
+        if is_deleted(marc):
+            ignored += 1
+        else:
+            added += 1
+            writer.write_marc(marc)
+    updates.close()
+    writer.close()
+
+    log_print(f'{str(total)} records read: {str(merged)} records updated, {str(deleted)} records deleted, '
+              f'{str(added)} records added')
+    if ignored:
+        log_print(f'{str(ignored)} records to be deleted were not found')
+    log_print(f'{str(writer.count)} records written to {str(args.o[0])}')
+    date_time_exit()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""Script to sort the records in one or more file(s) of MARC records"""
+
+from catbridge_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+NAME = 'marc_sort'
+SUMMARY = 'A utility to sort the records in one or more file(s) of MARC records by a field or subfield.'
+
+
+def main(argv=None):
+
+    if argv is None:
+        name = str(sys.argv[1])
+
+    cb = CatBridge(NAME, SUMMARY, ['i+', 'o'])
+    cb.parser.add_argument('--key', metavar='<key>', required=False, action='store', type=str, default='001',
+                           help='Key by which records are sorted: isbn, or a field tag optionally followed by '
+                                '$ and a subfield code, e.g. 245$a (default 001)')
+    cb.parser.add_argument('--memory', metavar='<MB>', required=False, action='store', type=int,
+                           default=MEMORY_LIMIT // 2 ** 20,
+                           help='Memory limit in MB for sorting the records (default 1024)')
+    args = cb.parse_args(argv)
+
+    key = SortKey(args.key)
+    logging.info(f'Sorting by {repr(key)}')
+
+    # Records are read lazily, so only the field containing the key is decoded;
+    # the raw data of each record is sorted and written unchanged
+    records = ExternalSorter(args.memory * 2 ** 20)
+    for file in input_files(args.i):
+        date_time_message(f'Reading file {str(file)}')
+        reader = MARCReader(file, lazy=True)
+        for record in reader:
+            records.add(key(record), bytes(record.raw))
+        reader.close()
+
+    date_time_message(f'Writing sorted records to {str(args.o[0])}')
+    writer = MARCWriter(args.o[0])
+    for k, marc in records.sorted():
+        writer.write_marc(marc)
+    writer.close()
+    records.close()
+    log_print(f'{str(writer.count)} records sorted')
+
+    date_time_exit()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""Script to split one or more file(s) of MARC records into shards"""
+
+import zlib
+from catbridge_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+NAME = 'marc_split'
+SUMMARY = 'A utility to split one or more file(s) of MARC records into shards by record count, size or record ID.'
+
+
+def shard_path(file, shard: int) -> str:
+    """Function to get the name of a shard of a file, e.g. file_001.lex"""
+    suffix = f'_{shard + 1:03d}'
+    return output_path(file, suffix=suffix, default=f'stdin{suffix}.lex')
+
+
+def split_by_hash(reader, file, shards: int) -> list:
+    """Function to split a file into shards by a hash of field 001, so that records with the same ID
+    are always written to the same shard. Records without field 001 are written to the first shard"""
+    writers = [MARCWriter(shard_path(file, i)) for i in range(shards)]
+    for block, offsets in read_record_blocks(reader.file_handle):
+        start = time.perf_counter()
+        for offset, end in zip(offsets[:-1], offsets[1:]):
+            marc = block[offset:end]
+            try:
+                record_id = get_control_field(marc) or ''
+            except ValueError:
+                raise CBError(f'Error reading file {os.path.basename(file)}: '
+                              f'invalid base address or directory in record at offset {str(offset)} of block')
+            writers[zlib.crc32(record_id.encode('utf-8')) % shards].write_marc(marc)
+        if reader.metrics is not None:
+            reader.metrics.add('read', time.perf_counter() - start, records=len(offsets) - 1, size=len(block))
+    for writer in writers:
+        writer.close()
+    return writers
+
+
+def split_at(reader, file, ends: list, by_size: bool) -> list:
+    """Function to split a file into len(ends) shards, where shard i ends with the first record which takes
+    the total number of records, or, if by_size is True, the total size of the records, to ends[i] or more.
+    A shard is empty if the record which ends the previous shard also takes the total to its end.
+    Consecutive records are written to each shard in as few writes as possible"""
+    writers, total = [MARCWriter(shard_path(file, 0))], 0
+    for block, offsets in read_record_blocks(reader.file_handle):
+        start, first = time.perf_counter(), 0
+        for i in range(1, len(offsets)):
+            total += offsets[i] - offsets[i - 1] if by_size else 1
+            if len(writers) < len(ends) and total >= ends[len(writers) - 1]:
+                # Write the records up to and including this one to the current shard, and start a new shard
+                writers[-1].write_block(block[offsets[first]:offsets[i]], i - first)
+                first = i
+                while len(writers) < len(ends) and total >= ends[len(writers) - 1]:
+                    writers[-1].close()
+                    writers.append(MARCWriter(shard_path(file, len(writers))))
+        writers[-1].write_block(block[offsets[first]:offsets[-1]], len(offsets) - 1 - first)
+        if reader.metrics is not None:
+            reader.metrics.add('read', time.perf_counter() - start, records=len(offsets) - 1, size=len(block))
+    while len(writers) < len(ends):
+        writers[-1].close()
+        writers.append(MARCWriter(shard_path(file, len(writers))))
+    writers[-1].close()
+    return writers
+
+
+def main(argv=None):
+
+    if argv is None:
+        name = str(sys.argv[1])
+
+    cb = CatBridge(NAME, SUMMARY, ['i+', ])
+    cb.parser.add_argument('-n', metavar='<shards>', required=True, action='store', type=int,
+                           help='Number of shards into which to split each file; '
+                                'exactly this number of shards is written, some of which may be empty')
+    cb.parser.add_argument('--by', required=False, action='store', type=str, default='records',
+                           choices=['records', 'size', 'hash'],
+                           help='Split into shards with equal numbers of records, of equal size, '
+                                'or by a hash of the record ID in field 001 (default records)')
+    args = cb.parse_args(argv)
+
+    if args.n < 1:
+        raise CBError(f'Error: the number of shards must be at least 1')
+
+    for file in input_files(args.i):
+        date_time_message(f'Splitting file {str(file)}')
+        reader = MARCReader(file)
+        reader.silent = True
+        try:
+            if args.by == 'hash':
+                writers = split_by_hash(reader, file, args.n)
+            elif args.by == 'size':
+                if file_size(file) is None:
+                    raise CBError(f'Error: the size of {str(file)} is not known, so it cannot be split by size')
+                size = file_size(file)
+                writers = split_at(reader, file, [-(-size * (i + 1) // args.n) for i in range(args.n)], True)
+            else:
+                if not reader.file_handle.seekable():
+                    raise CBError(f'Error: the records in {str(file)} cannot be counted in advance, '
+                                  f'so it cannot be split by number of records')
+                # The first count % n shards contain one more record than the others
+                count = reader.count_records()
+                writers = split_at(reader, file, [(i + 1) * (count // args.n) + min(i + 1, count % args.n)
+                                                  for i in range(args.n)], False)
+        except RecordLengthError as err:
+            raise CBError(f'Error reading file {os.path.basename(file)}: {err}')
+        reader.close()
+        for writer in writers:
+            log_print(f'File {os.path.basename(writer.path_to_file)} contains {str(writer.count)} records')
+
+    date_time_exit()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
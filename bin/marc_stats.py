@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""Script to count the fields, indicators, subfields and values in one or more file(s) of MARC records"""
+
+from catbridge_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+NAME = 'marc_stats'
+SUMMARY = 'A utility to count the fields, indicators, subfields and values in one or more file(s) of MARC records.'
+
+
+def main(argv=None):
+
+    if argv is None:
+        name = str(sys.argv[1])
+
+    cb = CatBridge(NAME, SUMMARY, ['i+', 'o'])
+    cb.parser.add_argument('--format', required=False, action='store', type=str, default='json',
+                           choices=['json', 'tsv'], help='Format of the output file (default json)')
+    cb.parser.add_argument('--subfields', required=False, action='store_true',
+                           help='Also count the indicators and subfield codes of data fields')
+    cb.parser.add_argument('--values', metavar='<field>', required=False, action='store', type=str, nargs='+',
+                           help='Also count the values of the specified fields or subfields, e.g. 008 040$a')
+    cb.parser.add_argument('--top', metavar='<n>', required=False, action='store', type=int, default=100,
+                           help='Number of the most common values of each field or subfield to output (default 100)')
+    cb.parser.add_argument('--workers', metavar='<n>', required=False, action='store', type=int, default=1,
+                           help='Number of processes to use to read the files (default 1)')
+    args = cb.parse_args(argv)
+
+    # Check the value specifications before any files are read
+    statistics = FieldStatistics(subfields=args.subfields, values=args.values)
+    if args.subfields:
+        logging.info('Counting indicators and subfields')
+    if args.values:
+        logging.info(f'Counting values of {", ".join(args.values)}')
+
+    files = input_files(args.i)
+    try:
+        # Files are divided into chunks by offset, so streams and compressed files are read by a single process
+        if args.workers > 1 and all(file_size(file) is not None for file in files):
+            date_time_message(f'Reading {str(len(files))} file(s) using {str(args.workers)} processes')
+            statistics = statistics_parallel(*files, subfields=args.subfields, values=args.values,
+                                             workers=args.workers)
+        else:
+            if args.workers > 1:
+                log_print('Standard input and compressed files are read by a single process')
+            for file in files:
+                date_time_message(f'Reading file {str(file)}')
+                file_stats = file_statistics(file, subfields=args.subfields, values=args.values)
+                log_print(f'File {os.path.basename(file)} contains {str(len(file_stats))} records')
+                statistics.update(file_stats)
+    except (RecordLengthError, LeaderError, DirectoryError, FieldsError, BaseAddressError,
+            BaseAddressLengthError, ValueError) as err:
+        raise CBError(f'Error reading records: {err}; use marc_check to find records with errors')
+
+    log_print(f'{str(len(statistics))} records read')
+    date_time_message(f'Writing statistics to {str(args.o[0])}')
+    statistics.write(args.o[0], output_format=args.format, top=args.top)
+
+    date_time_exit()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
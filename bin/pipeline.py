@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""Script to run several of the utilities on one or more file(s) of MARC records in a single pass"""
+
+from catbridge_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+NAME = 'pipeline'
+SUMMARY = 'A utility to run marc_check, fix_fmt, keep_fld and cn_find on MARC records in a single pass.'
+STAGES = ['check', 'fix_fmt', 'keep_fld', 'cn_find']
+
+
+def main(argv=None):
+
+    if argv is None:
+        name = str(sys.argv[1])
+
+    cb = CatBridge(NAME, SUMMARY, ['i+', ])
+    cb.parser.add_argument('-s', metavar='<stage>', required=True, action='store', type=str, nargs='+',
+                           choices=STAGES, help=f'Stages to run, in order ({", ".join(STAGES)})')
+    cb.parser.add_argument('--keep-config', metavar='<config_file>', required=False, action='store', type=str,
+                           help='Path to config file for keep_fld')
+    cb.parser.add_argument('--delete', required=False, action='store_true',
+                           help='keep_fld: *Delete* fields specified in <config_file>')
+    cb.parser.add_argument('--cn-config', metavar='<config_file>', required=False, action='store', type=str,
+                           help='Path to config file for cn_find')
+    cb.parser.add_argument('--cn-output', metavar='<output_file>', required=False, action='store', type=str,
+                           help='Path to output file for cn_find')
+    cb.parser.add_argument('--conv', required=False, action='store_true',
+                           help='cn_find: Convert 10-digit ISBNs to 13-digit form where possible')
+    cb.parser.add_argument('--rid', required=False, action='store_true',
+                           help='cn_find: Include record ID as the first column of the output file')
+    cb.parser.add_argument('--tidy', required=False, action='store_true',
+                           help='cn_find: Sort and de-duplicate list')
+    cb.parser.add_argument('--memory', metavar='<MB>', required=False, action='store', type=int,
+                           default=MEMORY_LIMIT // 2 ** 20,
+                           help='cn_find: Memory limit in MB for sorting and de-duplicating the list (default 1024)')
+
+    args = cb.parse_args(argv)
+
+    if len(set(args.s)) < len(args.s):
+        raise CBError(f'Error: each stage can only be run once')
+
+    stages = []
+    for s in args.s:
+        if s == 'check':
+            stages.append(CheckStage())
+        elif s == 'fix_fmt':
+            stages.append(FixFormatStage())
+        elif s == 'keep_fld':
+            if not args.keep_config:
+                raise CBError(f'Error: stage keep_fld requires option --keep-config')
+            check_file_location(args.keep_config, 'config file')
+            date_time_message(f'Reading config file from {str(args.keep_config)}')
+            stages.append(KeepFieldStage(args.keep_config, delete=args.delete))
+            logging.info(f'Search for records matching:\n\n{str(stages[-1].rules)}\n')
+        elif s == 'cn_find':
+            if not (args.cn_config and args.cn_output):
+                raise CBError(f'Error: stage cn_find requires options --cn-config and --cn-output')
+            check_file_location(args.cn_config, 'config file')
+            date_time_message(f'Reading config file from {str(args.cn_config)}')
+            stages.append(ControlNumberStage(args.cn_config, args.cn_output, convert=args.conv, rid=args.rid,
+                                             tidy=args.tidy, memory_limit=args.memory * 2 ** 20))
+            logging.info(f'Search target: {repr(stages[-1].rules)}')
+
+    pipeline = Pipeline(stages)
+    logging.info(f'Pipeline: {repr(pipeline)}')
+
+    for file in input_files(args.i):
+        date_time_message(f'Reading file {str(file)}')
+        pipeline.run(file)
+
+    pipeline.close()
+    date_time_exit()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,2 +1,6 @@
+from catbridge_tools.db_tools import *
 from catbridge_tools.functions import *
-from catbridge_tools.marc_tools import *
\ No newline at end of file
+from catbridge_tools.marc_tools import *
+from catbridge_tools.pipeline_tools import *
+from catbridge_tools.rule_tools import *
+from catbridge_tools.stats_tools import *
\ No newline at end of file
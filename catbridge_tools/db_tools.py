@@ -0,0 +1,438 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# ====================
+#       Set-up
+# ====================
+
+
+# Import required modules
+import sqlite3
+from catbridge_tools.rule_tools import *
+from io import StringIO
+
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+# ====================
+#     Constants
+# ====================
+
+
+# Number of records inserted by each call to executemany
+BATCH_SIZE = 10000
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS files (file_id INTEGER PRIMARY KEY, path TEXT, size INTEGER, '
+    'mtime INTEGER, records INTEGER, loaded TEXT)',
+    'CREATE TABLE IF NOT EXISTS records (record_id INTEGER PRIMARY KEY, file_id INTEGER NOT NULL, '
+    'position INTEGER NOT NULL, id TEXT, leader TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS fields (field_id INTEGER PRIMARY KEY, record_id INTEGER NOT NULL, '
+    'position INTEGER NOT NULL, tag TEXT NOT NULL, indicator1 TEXT, indicator2 TEXT, data TEXT)',
+    'CREATE TABLE IF NOT EXISTS subfields (field_id INTEGER NOT NULL, position INTEGER NOT NULL, '
+    'code TEXT NOT NULL, value TEXT NOT NULL)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS files_path ON files (path)',
+]
+
+# Indexes which are dropped while records are loaded, and created again afterwards
+INDEXES = OrderedDict([
+    ('records_file', 'records (file_id)'),
+    ('records_id', 'records (id)'),
+    ('fields_record', 'fields (record_id)'),
+    ('fields_tag', 'fields (tag, record_id)'),
+    ('subfields_field', 'subfields (field_id)'),
+    ('subfields_code', 'subfields (code, field_id)'),
+])
+
+CN_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS files (file_id INTEGER PRIMARY KEY, path TEXT, size INTEGER, '
+    'mtime INTEGER, records INTEGER, checksum TEXT, indexed TEXT)',
+    'CREATE TABLE IF NOT EXISTS records (file_id INTEGER NOT NULL, byte_offset INTEGER NOT NULL, '
+    'length INTEGER NOT NULL, id TEXT, PRIMARY KEY (file_id, byte_offset)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS numbers (number TEXT NOT NULL, file_id INTEGER NOT NULL, '
+    'byte_offset INTEGER NOT NULL)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS files_path ON files (path)',
+]
+
+# Indexes of the control number index which are dropped while records are indexed, and created again afterwards
+CN_INDEXES = OrderedDict([
+    ('numbers_number', 'numbers (number)'),
+    ('numbers_record', 'numbers (file_id, byte_offset)'),
+])
+
+# Number of bytes at the end of an indexed file used to check that it has only been appended to
+CHECKSUM_LENGTH = 2 ** 16
+
+
+# ====================
+#       Classes
+# ====================
+
+
+class MARCDatabase(object):
+    """SQLite database holding the records from one or more files of MARC records.
+
+    Records are held in four tables:
+        files       the files loaded into the database
+        records     one row per record, with the record ID from field 001 and the leader
+        fields      one row per field, with the indicators of data fields and the contents of control fields
+        subfields   one row per subfield of a data field
+    position gives the order of records within their file, fields within their record,
+    and subfields within their field, counting from 0.
+
+    Files which have already been loaded are skipped unless they have changed, in which case they are replaced,
+    so that new files can be appended to an existing database"""
+
+    def __init__(self, path_to_db: str, batch_size: int = BATCH_SIZE):
+        self.path_to_db = path_to_db
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path_to_db)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        self.connection.commit()
+        self.metrics = Metrics.active
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def drop_indexes(self):
+        for name in INDEXES:
+            self.connection.execute(f'DROP INDEX IF EXISTS {name}')
+        self.connection.commit()
+
+    def create_indexes(self):
+        """Function to create the indexes, if they do not already exist"""
+        for name, columns in INDEXES.items():
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {columns}')
+        self.connection.execute('ANALYZE')
+        self.connection.commit()
+
+    def next_id(self, table: str, column: str) -> int:
+        return (self.connection.execute(f'SELECT MAX({column}) FROM {table}').fetchone()[0] or 0) + 1
+
+    @staticmethod
+    def file_state(path_to_file: str) -> tuple:
+        """Function to get the path, size and modification time recorded for a file.
+        Streams have no path, size or modification time"""
+        if path_to_file == STREAM:
+            return STREAM, None, None
+        stat = os.stat(path_to_file)
+        return os.path.abspath(path_to_file), stat.st_size, stat.st_mtime_ns
+
+    def is_loaded(self, path_to_file: str) -> bool:
+        """Function to test whether a file has been loaded, and has not changed since"""
+        path, size, mtime = self.file_state(path_to_file)
+        if path == STREAM:
+            return False
+        row = self.connection.execute('SELECT size, mtime FROM files WHERE path = ?', (path,)).fetchone()
+        return row is not None and tuple(row) == (size, mtime)
+
+    def delete_file(self, path_to_file: str):
+        """Function to delete the records loaded from a file"""
+        path = self.file_state(path_to_file)[0]
+        row = self.connection.execute('SELECT file_id FROM files WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return
+        for statement in [
+            'DELETE FROM subfields WHERE field_id IN (SELECT field_id FROM fields WHERE record_id IN '
+            '(SELECT record_id FROM records WHERE file_id = ?))',
+            'DELETE FROM fields WHERE record_id IN (SELECT record_id FROM records WHERE file_id = ?)',
+            'DELETE FROM records WHERE file_id = ?',
+            'DELETE FROM files WHERE file_id = ?',
+        ]:
+            self.connection.execute(statement, row)
+        self.connection.commit()
+
+    def load(self, path_to_file: str) -> int:
+        """Function to load the records from a file in a single transaction.
+        Rows are inserted in batches of batch_size records. Returns the number of records loaded"""
+        path, size, mtime = self.file_state(path_to_file)
+        cursor = self.connection.cursor()
+        # Streams are recorded without a path, since they cannot be recognised if they are loaded again
+        cursor.execute('INSERT INTO files (path, size, mtime) VALUES (?, ?, ?)',
+                       (None if path == STREAM else path, size, mtime))
+        file_id = cursor.lastrowid
+        record_id, field_id = self.next_id('records', 'record_id'), self.next_id('fields', 'field_id')
+        records, fields, subfields = [], [], []
+        reader = MARCReader(path_to_file)
+        for position, record in enumerate(reader):
+            control_number = record['001']
+            records.append((record_id, file_id, position,
+                            control_number.data.strip() if control_number is not None
+                            and control_number.is_control_field() else None, record.leader))
+            for i, field in enumerate(record):
+                if field.is_control_field():
+                    fields.append((field_id, record_id, i, field.tag, None, None, field.data))
+                else:
+                    fields.append((field_id, record_id, i, field.tag, field.indicator1, field.indicator2, None))
+                    values = field.subfields
+                    subfields.extend((field_id, j, code, value)
+                                     for j, (code, value) in enumerate(zip(values[0::2], values[1::2])))
+                field_id += 1
+            record_id += 1
+            if len(records) >= self.batch_size:
+                self.insert(cursor, records, fields, subfields)
+                records, fields, subfields = [], [], []
+        reader.close()
+        self.insert(cursor, records, fields, subfields)
+        total = reader.count
+        cursor.execute('UPDATE files SET records = ?, loaded = ? WHERE file_id = ?',
+                       (total, datetime.datetime.now().isoformat(timespec='seconds'), file_id))
+        self.connection.commit()
+        return total
+
+    def insert(self, cursor, records: list, fields: list, subfields: list):
+        if not records:
+            return
+        start = time.perf_counter()
+        cursor.executemany('INSERT INTO records VALUES (?, ?, ?, ?, ?)', records)
+        cursor.executemany('INSERT INTO fields VALUES (?, ?, ?, ?, ?, ?, ?)', fields)
+        cursor.executemany('INSERT INTO subfields VALUES (?, ?, ?, ?)', subfields)
+        if self.metrics is not None:
+            self.metrics.add('write', time.perf_counter() - start, records=len(records), fields=len(fields))
+
+
+class KeyStore(object):
+    """Set of keys, such as record IDs, held in an SQLite table on disk, so that memory use is bounded.
+
+    A Bloom filter in memory records which keys may have been added,
+    so that the table only needs to be searched for keys which have probably been seen before.
+    New keys are inserted into the table in batches of batch_size.
+    If path_to_db is None, the table is held in a temporary file which is deleted when the store is closed"""
+
+    def __init__(self, path_to_db: str = None, capacity: int = 10 ** 7, error_rate: float = 0.01,
+                 batch_size: int = BATCH_SIZE):
+        self.temporary = path_to_db is None
+        if self.temporary:
+            handle, path_to_db = tempfile.mkstemp(suffix='.db')
+            os.close(handle)
+        self.path_to_db = path_to_db
+        self.batch_size = batch_size
+        self.bloom_filter = BloomFilter(capacity, error_rate)
+        self.pending = set()
+        self.connection = sqlite3.connect(path_to_db)
+        if self.temporary:
+            # The table does not need to survive a crash
+            self.connection.execute('PRAGMA journal_mode = OFF')
+            self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY) WITHOUT ROWID')
+        for (key,) in self.connection.execute('SELECT key FROM keys'):
+            self.bloom_filter.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        if key not in self.bloom_filter:
+            return False
+        if key in self.pending:
+            return True
+        return self.connection.execute('SELECT 1 FROM keys WHERE key = ?', (key,)).fetchone() is not None
+
+    def add(self, key: str) -> bool:
+        """Function to add a key. Returns True if the key had already been added"""
+        if self.bloom_filter.add(key) and key in self:
+            return True
+        self.pending.add(key)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return False
+
+    def flush(self):
+        if self.pending:
+            self.connection.executemany('INSERT OR IGNORE INTO keys VALUES (?)', ((key,) for key in self.pending))
+            self.connection.commit()
+            self.pending = set()
+
+    def close(self):
+        if self.connection is None:
+            return
+        self.flush()
+        self.connection.close()
+        self.connection = None
+        if self.temporary:
+            os.remove(self.path_to_db)
+
+
+class ControlNumberIndex(object):
+    """Inverted index from the control numbers found by a set of ControlNumberRules
+    to the records containing them, held in an SQLite database.
+
+    The index holds the position of each record within its file, so that matching records can be read
+    without reading the rest of the file. Records are held in three tables:
+        files       the files indexed, with their size and modification time when they were indexed
+        records     one row per record, with its offset and length in bytes and the record ID from field 001
+        numbers     one row per control number in each record, normalised as by cn_find
+    The config file and the conversion of 10-digit ISBNs are held in the table settings,
+    and an index can only be updated with the same settings.
+
+    Files which have grown since they were indexed, and which end with the same data as before,
+    are assumed to have had records appended, and only the new records are indexed.
+    Files which have changed in any other way are indexed again.
+    Streams and compressed files cannot be indexed, since their records cannot be read by offset"""
+
+    def __init__(self, path_to_db: str, batch_size: int = BATCH_SIZE):
+        self.path_to_db = path_to_db
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path_to_db)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        for statement in CN_SCHEMA:
+            self.connection.execute(statement)
+        self.connection.commit()
+        self.settings = dict(self.connection.execute('SELECT name, value FROM settings'))
+        self.rules = None
+        if 'config' in self.settings:
+            self.rules = ControlNumberRules(StringIO(self.settings['config']))
+        self.convert = self.settings.get('convert') == '1'
+        self.metrics = Metrics.active
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def configure(self, rules: ControlNumberRules, convert: bool = False):
+        """Function to set the rules used to find control numbers, which must match those of an existing index"""
+        settings = {'config': repr(rules), 'convert': '1' if convert else '0'}
+        if self.settings and self.settings != settings:
+            raise CBError(f'Error: index {str(self.path_to_db)} was built with a different config file '
+                          f'or conversion of ISBNs; use --rebuild to build it again')
+        if not self.settings:
+            self.connection.executemany('INSERT INTO settings VALUES (?, ?)', settings.items())
+            self.connection.commit()
+            self.settings = settings
+        self.rules, self.convert = rules, convert
+
+    def clear(self):
+        """Function to delete all the files, records and settings from the index"""
+        for table in ['settings', 'files', 'records', 'numbers']:
+            self.connection.execute(f'DELETE FROM {table}')
+        self.connection.commit()
+        self.settings, self.rules, self.convert = {}, None, False
+
+    def drop_indexes(self):
+        for name in CN_INDEXES:
+            self.connection.execute(f'DROP INDEX IF EXISTS {name}')
+        self.connection.commit()
+
+    def create_indexes(self):
+        """Function to create the indexes, if they do not already exist"""
+        for name, columns in CN_INDEXES.items():
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {columns}')
+        self.connection.execute('ANALYZE')
+        self.connection.commit()
+
+    @staticmethod
+    def checksum(path_to_file: str, size: int) -> str:
+        """Function to get a hash of the last CHECKSUM_LENGTH bytes of the first size bytes of a file"""
+        with open(path_to_file, mode='rb') as file_handle:
+            file_handle.seek(max(0, size - CHECKSUM_LENGTH))
+            return hashlib.blake2b(file_handle.read(min(size, CHECKSUM_LENGTH)), digest_size=16).hexdigest()
+
+    def file_state(self, path_to_file: str) -> tuple:
+        """Function to compare a file with its state when it was indexed.
+        Returns a tuple (state, start), where state is new, unchanged, appended or changed,
+        and start is the offset from which records need to be indexed"""
+        if path_to_file == STREAM or compression(path_to_file):
+            raise CBError(f'Error: {str(path_to_file)} cannot be indexed, since its records cannot be read by offset')
+        path, size, mtime = MARCDatabase.file_state(path_to_file)
+        row = self.connection.execute('SELECT size, mtime, checksum FROM files WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return 'new', 0
+        if (size, mtime) == tuple(row[:2]):
+            return 'unchanged', size
+        if size > row[0] and self.checksum(path_to_file, row[0]) == row[2]:
+            return 'appended', row[0]
+        return 'changed', 0
+
+    def delete_file(self, path_to_file: str):
+        """Function to delete the records indexed from a file"""
+        path = MARCDatabase.file_state(path_to_file)[0]
+        row = self.connection.execute('SELECT file_id FROM files WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return
+        for table in ['numbers', 'records', 'files']:
+            self.connection.execute(f'DELETE FROM {table} WHERE file_id = ?', row)
+        self.connection.commit()
+
+    def index(self, path_to_file: str, start: int = 0) -> int:
+        """Function to index the records in a file from offset start, in a single transaction.
+        Returns the number of records indexed"""
+        path, size, mtime = MARCDatabase.file_state(path_to_file)
+        cursor = self.connection.cursor()
+        row = cursor.execute('SELECT file_id FROM files WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            cursor.execute('INSERT INTO files (path, records) VALUES (?, 0)', (path,))
+            file_id = cursor.lastrowid
+        else:
+            file_id = row[0]
+        records, numbers = [], []
+        reader = MARCReader(path_to_file, lazy=True)
+        reader.file_handle.seek(start)
+        reader.processed = offset = start
+        for record in reader:
+            try:
+                record_id = get_control_field(record.raw)
+            except (ValueError, UnicodeDecodeError):
+                record_id = None
+            records.append((file_id, offset, len(record.raw), record_id))
+            # Each control number is indexed once for each record in which it occurs
+            found = OrderedDict.fromkeys(self.rules.find(record, convert=self.convert))
+            numbers.extend((t, file_id, offset) for t in found)
+            offset += len(record.raw)
+            if len(records) >= self.batch_size:
+                self.insert(cursor, records, numbers)
+                records, numbers = [], []
+        reader.close()
+        self.insert(cursor, records, numbers)
+        cursor.execute('UPDATE files SET size = ?, mtime = ?, records = records + ?, checksum = ?, indexed = ? '
+                       'WHERE file_id = ?',
+                       (size, mtime, reader.count, self.checksum(path_to_file, size),
+                        datetime.datetime.now().isoformat(timespec='seconds'), file_id))
+        self.connection.commit()
+        return reader.count
+
+    def insert(self, cursor, records: list, numbers: list):
+        if not records:
+            return
+        start = time.perf_counter()
+        cursor.executemany('INSERT INTO records VALUES (?, ?, ?, ?)', records)
+        cursor.executemany('INSERT INTO numbers VALUES (?, ?, ?)', numbers)
+        if self.metrics is not None:
+            self.metrics.add('write', time.perf_counter() - start, records=len(records))
+
+    def stale_files(self) -> list:
+        """Function to get the paths of the files which have changed since they were indexed"""
+        stale = []
+        for path, size, mtime in self.connection.execute('SELECT path, size, mtime FROM files'):
+            if not os.path.isfile(path) or MARCDatabase.file_state(path)[1:] != (size, mtime):
+                stale.append(path)
+        return stale
+
+    def match(self, numbers: list) -> list:
+        """Function to find the records containing any of a list of control numbers.
+        Returns a list of (number, path, offset, length, record ID) tuples,
+        in the order of the numbers, and then of the records within the indexed files"""
+        cursor = self.connection.cursor()
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS queries (position INTEGER PRIMARY KEY, number TEXT)')
+        cursor.execute('DELETE FROM queries')
+        cursor.executemany('INSERT INTO queries VALUES (?, ?)', enumerate(numbers))
+        matches = cursor.execute(
+            'SELECT queries.number, files.path, records.byte_offset, records.length, records.id FROM queries '
+            'JOIN numbers ON numbers.number = queries.number '
+            'JOIN records ON records.file_id = numbers.file_id AND records.byte_offset = numbers.byte_offset '
+            'JOIN files ON files.file_id = numbers.file_id '
+            'ORDER BY queries.position, numbers.file_id, numbers.byte_offset').fetchall()
+        cursor.execute('DELETE FROM queries')
+        return matches
@@ -1,15 +1,33 @@
 import argparse
+import atexit
+import bz2
 from collections import OrderedDict
 import datetime
 import gc
 import glob
+import gzip
+import hashlib
+import heapq
+import json
+import lzma
+import math
 import os
+import struct
 import sys
+import tempfile
 import time
 from functools import wraps
+from itertools import groupby
+from operator import itemgetter
 from catbridge_tools.isbn_tools import *
 from catbridge_tools.logs import *
 
+# The resource module is not available on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
 ARGS = {
     'i': lambda parser: parser.add_argument('-i', metavar='<input_file>', required=True, action='store', type=str,
                                             nargs=1, help='path to input file'),
@@ -21,6 +39,18 @@ ARGS = {
                                             nargs=1, help='path to config file'),
 }
 
+# Files with these extensions are compressed and decompressed as they are written and read
+COMPRESSION = OrderedDict([
+    ('.gz', lambda path_to_file, mode, **kwargs: gzip.open(path_to_file, mode, compresslevel=6, **kwargs)),
+    ('.bz2', bz2.open),
+    ('.xz', lzma.open),
+])
+
+MEMORY_LIMIT = 2 ** 30
+
+# File name denoting standard input or standard output
+STREAM = '-'
+
 OPTS = OrderedDict([
     ('debug', ['Debug mode', False]),
     ('help', ['Show help message and exit', False]),
@@ -33,6 +63,8 @@ class CBError(Exception):
     def __init__(self, value):
         logging.error(str(value))
         self.value = value
+        if Metrics.active is not None:
+            Metrics.active.count_error()
 
     def __str__(self):
         return repr(self.value)
@@ -43,11 +75,14 @@ class CatBridge:
     def __init__(self, name: str, summary: str, args: list) -> None:
         self.name = name
         self.summary = summary
-        self.info()
         self.parser = argparse.ArgumentParser(prog=name)
         for a in args:
             ARGS[a](self.parser)
         self.parser.add_argument('--debug', required=False, action='store_true', help='debug mode'),
+        self.parser.add_argument('--metrics', metavar='<metrics_file>', required=False, action='store', type=str,
+                                 help='Write timings and counts for each stage of processing to <metrics_file> as JSON')
+        self.parser.add_argument('--metrics-interval', metavar='<seconds>', required=False, action='store', type=float,
+                                 help='With --metrics, also record a snapshot every <seconds> seconds')
 
     def __repr__(self) -> str:
         return(f'========================================\n{self.name}\n'
@@ -58,6 +93,10 @@ class CatBridge:
         print(repr(self))
 
     def parse_args(self, argv) -> argparse.Namespace:
+        if STREAM in argv:
+            # Records may be piped through standard output, so console messages are sent to standard error
+            sys.stdout = sys.stderr
+        self.info()
         if len(argv) == 0:
             self.parser.print_help()
             logging.info('No options set')
@@ -67,15 +106,389 @@ class CatBridge:
         if args.debug:
             logger.setLevel(logging.DEBUG)
             logging.info('Logging level set to DEBUG')
+        if args.metrics:
+            logging.info(f'Writing metrics to {args.metrics}')
+            Metrics(args.metrics, self.name, interval=args.metrics_interval).activate()
         return args
 
 
+class Metrics:
+    """Collects timings and counts for each stage of processing, and writes them to a file as JSON.
+
+    The stages are read, decode, process, encode and write.
+    MARCReader records the read and decode stages, and MARCWriter the encode and write stages.
+    Time spent on each input file which is not in any of these stages is counted as process.
+    While a Metrics object is active (see CatBridge --metrics), readers and writers use it by default"""
+
+    active = None
+    STAGES = ('read', 'decode', 'process', 'encode', 'write')
+
+    def __init__(self, path_to_file: str = None, name: str = '', interval: float = None):
+        self.path_to_file = path_to_file
+        self.name = name
+        self.interval = interval
+        self.started, self.start = datetime.datetime.now(), time.perf_counter()
+        self.stages = OrderedDict((stage, self.new_stage()) for stage in self.STAGES)
+        self.errors = 0
+        self.files, self.file = [], None
+        self.snapshots, self.next_snapshot = [], self.start + (interval or 0)
+
+    @staticmethod
+    def new_stage() -> OrderedDict:
+        return OrderedDict([('seconds', 0.0), ('records', 0), ('bytes', 0), ('fields', 0)])
+
+    def activate(self):
+        """Function to make this the default Metrics object, and write it to its file at exit"""
+        Metrics.active = self
+        atexit.register(self.finish)
+
+    def start_file(self, path_to_file: str):
+        """Function to start collecting metrics for an input file"""
+        self.end_file()
+        self.file = OrderedDict([('path', path_to_file), ('start', time.perf_counter()), ('errors', 0),
+                                 ('stages', OrderedDict((stage, self.new_stage()) for stage in self.STAGES))])
+
+    def end_file(self):
+        """Function to finish collecting metrics for the current input file"""
+        if self.file is None:
+            return
+        file, self.file = self.file_summary(self.file), None
+        self.stages['process']['seconds'] += file['stages']['process']['seconds']
+        self.files.append(file)
+
+    @staticmethod
+    def file_summary(file: OrderedDict) -> OrderedDict:
+        """Function to get the metrics collected so far for an input file, as a copy,
+        so that the metrics for a file in progress can be written without changing them"""
+        summary = OrderedDict((key, value) for key, value in file.items() if key != 'start')
+        summary['stages'] = OrderedDict((stage, OrderedDict(totals)) for stage, totals in file['stages'].items())
+        elapsed = time.perf_counter() - file['start']
+        # Time not spent reading, decoding, encoding or writing is spent processing records
+        summary['stages']['process']['seconds'] = elapsed - sum(stage['seconds'] for stage in file['stages'].values())
+        summary['elapsed_seconds'] = elapsed
+        summary['records'] = summary['stages']['read']['records']
+        summary['records_per_second'] = summary['records'] / elapsed if elapsed > 0 else None
+        return summary
+
+    def add(self, stage: str, seconds: float, records: int = 1, size: int = 0, fields: int = 0):
+        """Function to add the time taken to process records in a stage"""
+        stages_to_update = [self.stages] if self.file is None else [self.stages, self.file['stages']]
+        for stages in stages_to_update:
+            totals = stages[stage]
+            totals['seconds'] += seconds
+            totals['records'] += records
+            totals['bytes'] += size
+            totals['fields'] += fields
+        if self.interval and time.perf_counter() >= self.next_snapshot:
+            self.snapshot()
+
+    def count_error(self, errors: int = 1):
+        self.errors += errors
+        if self.file:
+            self.file['errors'] += errors
+
+    def snapshot(self):
+        """Function to record the progress so far, and write the metrics to the file"""
+        elapsed = time.perf_counter() - self.start
+        records = self.stages['read']['records']
+        self.snapshots.append(OrderedDict([
+            ('elapsed_seconds', elapsed),
+            ('records', records),
+            ('bytes', self.stages['read']['bytes']),
+            ('errors', self.errors),
+            ('records_per_second', records / elapsed if elapsed > 0 else None),
+            ('peak_rss_bytes', peak_rss()),
+        ]))
+        self.next_snapshot = time.perf_counter() + self.interval
+        self.write()
+
+    def as_dict(self) -> OrderedDict:
+        elapsed = time.perf_counter() - self.start
+        records = self.stages['read']['records']
+        return OrderedDict([
+            ('tool', self.name),
+            ('started', self.started.isoformat(timespec='seconds')),
+            ('elapsed_seconds', elapsed),
+            ('records', records),
+            ('bytes_read', self.stages['read']['bytes']),
+            ('bytes_written', self.stages['write']['bytes']),
+            ('fields', self.stages['decode']['fields']),
+            ('errors', self.errors),
+            ('records_per_second', records / elapsed if elapsed > 0 else None),
+            ('peak_rss_bytes', peak_rss()),
+            ('stages', self.stages),
+            ('files', self.files + ([] if self.file is None else [self.file_summary(self.file)])),
+            ('snapshots', self.snapshots),
+        ])
+
+    def finish(self):
+        """Function to finish collecting metrics for the current input file, and write the metrics to the file"""
+        self.end_file()
+        self.write()
+
+    def write(self):
+        """Function to write the metrics to the file as JSON.
+        The metrics for the current input file, if any, are included without finishing it"""
+        if self.path_to_file:
+            with open(self.path_to_file, mode='w', encoding='utf-8') as ofile:
+                json.dump(self.as_dict(), ofile, indent=2)
+
+
+class ExternalSorter:
+    """Sorts (key, value) pairs, where key is a string and value is bytes, using a bounded amount of memory.
+
+    Pairs are held in memory until their approximate size reaches memory_limit bytes.
+    They are then sorted by key and written to a temporary file as a sorted run.
+    The runs are merged when the pairs are read back. Pairs with equal keys are kept in the order they were added.
+    To limit the number of open files, runs are merged in tiers: each run written from memory is at level 0,
+    and whenever the last MERGE_RUNS runs are at the same level they are merged into one run at the next level.
+    Only runs of about the same size are merged, so each pair is written a logarithmic number of times"""
+
+    RUN_ENTRY = struct.Struct('<II')
+    MERGE_RUNS = 16
+
+    def __init__(self, memory_limit: int = MEMORY_LIMIT):
+        self.memory_limit = memory_limit
+        self.pairs, self.size = [], 0
+        # The level of each run, which does not increase along the list
+        self.runs, self.levels = [], []
+
+    def add(self, key: str, value: bytes = b''):
+        self.pairs.append((key, value))
+        self.size += sys.getsizeof(key) + sys.getsizeof(value) + 72
+        if self.size >= self.memory_limit:
+            self.spill()
+
+    def spill(self):
+        """Function to write the pairs held in memory to a sorted run"""
+        if self.pairs:
+            self.pairs.sort(key=itemgetter(0))
+            self.write_run(self.pairs)
+            self.pairs, self.size = [], 0
+
+    def write_run(self, pairs, level: int = 0):
+        """Function to write pairs, which must already be sorted by key, to a new run"""
+        run = tempfile.TemporaryFile()
+        buffer = []
+        for key, value in pairs:
+            key = key.encode('utf-8')
+            buffer.extend((self.RUN_ENTRY.pack(len(key), len(value)), key, value))
+            if len(buffer) >= 3 * 2 ** 12:
+                run.write(b''.join(buffer))
+                buffer = []
+        run.write(b''.join(buffer))
+        run.seek(0)
+        self.runs.append(run)
+        self.levels.append(level)
+        # The runs merged are the most recent, and the merged run replaces them at the end of the list,
+        # so pairs with equal keys stay in the order they were added
+        if len(self.runs) >= self.MERGE_RUNS and self.levels[-self.MERGE_RUNS] == level:
+            runs = self.runs[-self.MERGE_RUNS:]
+            del self.runs[-self.MERGE_RUNS:], self.levels[-self.MERGE_RUNS:]
+            self.write_run(heapq.merge(*[self.read_run(r) for r in runs], key=itemgetter(0)), level + 1)
+            for r in runs:
+                r.close()
+
+    def read_run(self, run):
+        """Generator to read the pairs in a run"""
+        while True:
+            header = run.read(self.RUN_ENTRY.size)
+            if not header:
+                return
+            key_length, value_length = self.RUN_ENTRY.unpack(header)
+            yield run.read(key_length).decode('utf-8'), run.read(value_length)
+
+    def sorted(self):
+        """Generator to yield all pairs in order of key"""
+        if not self.runs:
+            self.pairs.sort(key=itemgetter(0))
+            yield from self.pairs
+            return
+        self.spill()
+        logging.debug(f'Merging {str(len(self.runs))} sorted runs')
+        yield from heapq.merge(*[self.read_run(run) for run in self.runs], key=itemgetter(0))
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.pairs, self.size, self.runs, self.levels = [], 0, [], []
+
+
+class ExternalDeduplicator:
+    """Sorts and de-duplicates strings using a bounded amount of memory.
+
+    Strings are de-duplicated in memory until their approximate size reaches memory_limit bytes,
+    then written as a sorted run, recording whether each has been seen more than once"""
+
+    def __init__(self, memory_limit: int = MEMORY_LIMIT):
+        self.memory_limit = memory_limit
+        self.seen, self.size = {}, 0
+        self.sorter = ExternalSorter(memory_limit)
+
+    def add(self, s: str):
+        if s in self.seen:
+            self.seen[s] = b'1'
+            return
+        self.seen[s] = b''
+        self.size += sys.getsizeof(s) + 100
+        if self.size >= self.memory_limit:
+            self.sorter.write_run(sorted(self.seen.items()))
+            self.seen, self.size = {}, 0
+
+    def sorted(self):
+        """Generator to yield (string, duplicate) tuples in order, where duplicate is True
+        if the string was added more than once"""
+        if self.sorter.runs:
+            self.sorter.write_run(sorted(self.seen.items()))
+            self.seen, self.size = {}, 0
+            for s, flags in groupby(self.sorter.sorted(), key=itemgetter(0)):
+                flags = [flag for key, flag in flags]
+                yield s, len(flags) > 1 or flags[0] == b'1'
+        else:
+            for s in sorted(self.seen):
+                yield s, self.seen[s] == b'1'
+
+    def close(self):
+        self.sorter.close()
+        self.seen, self.size = {}, 0
+
+
+class BloomFilter:
+    """Set of strings held in a fixed amount of memory, sized for a given number of strings.
+
+    A string which has been added is always found; a string which has not been added
+    is wrongly found with a probability of about error_rate, while no more than capacity strings have been added"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / max(capacity, 1) * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def __contains__(self, s: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self.positions(s))
+
+    def positions(self, s: str):
+        """Function to get the positions of the bits for a string, by double hashing a single digest"""
+        digest = hashlib.blake2b(s.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, s: str) -> bool:
+        """Function to add a string. Returns True if the string may already have been added"""
+        found = True
+        for p in self.positions(s):
+            byte, bit = p >> 3, 1 << (p & 7)
+            if not self.bits[byte] & bit:
+                found = False
+                self.bits[byte] |= bit
+        return found
+
+
+def peak_rss():
+    """Function to get the peak resident set size of the process in bytes, or None if it cannot be determined"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+        get_current_process.restype = wintypes.HANDLE
+        get_process_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_process_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+        if get_process_memory_info(get_current_process(), ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except Exception:
+        pass
+    return None
+
+
 def check_file_location(to_check, role):
     for file in glob.glob(to_check):
         if not os.path.isfile(file):
             raise CBError(f'Error: Could not locate {role} at {str(file)}')
 
 
+def compression(path_to_file: str):
+    """Function to get the extension denoting the compression of a file, or None if it is not compressed"""
+    for extension in COMPRESSION:
+        if path_to_file.lower().endswith(extension):
+            return extension
+    return None
+
+
+def open_file(path_to_file, mode: str = 'rb', **kwargs):
+    """Function to open a file for reading or writing.
+    path_to_file may be - for standard input or output, or a file object, which is returned unchanged.
+    Files with the extensions in COMPRESSION are decompressed or compressed as they are read or written"""
+    if not isinstance(path_to_file, str):
+        return path_to_file
+    if path_to_file == STREAM:
+        # The standard streams are not closed when the file is closed
+        if 'r' in mode:
+            return open(sys.stdin.fileno(), mode=mode, closefd=False, **kwargs)
+        sys.__stdout__.flush()
+        return open(sys.__stdout__.fileno(), mode=mode, closefd=False, **kwargs)
+    extension = compression(path_to_file)
+    if extension is not None:
+        return COMPRESSION[extension](path_to_file, mode if 'b' in mode else f'{mode}t', **kwargs)
+    return open(path_to_file, mode=mode, **kwargs)
+
+
+def file_name(path_to_file) -> str:
+    """Function to get the name of a file to report in messages, given a path or a file object"""
+    if isinstance(path_to_file, str):
+        return path_to_file
+    return str(getattr(path_to_file, 'name', STREAM))
+
+
+def file_size(path_to_file):
+    """Function to get the size in bytes of the data in a file,
+    or None if it cannot be known before the file is read, as for streams and compressed files"""
+    if not isinstance(path_to_file, str) or path_to_file == STREAM or compression(path_to_file) is not None:
+        return None
+    return os.path.getsize(path_to_file)
+
+
+def input_files(patterns: list) -> list:
+    """Function to get the list of input files matching the given file names, which may contain wildcards.
+    - denotes standard input"""
+    files = []
+    for pattern in patterns:
+        if pattern == STREAM:
+            files.append(STREAM)
+            continue
+        for file in glob.glob(pattern):
+            if not os.path.isfile(file):
+                raise CBError(f'Error: Could not locate {str(file)}')
+            files.append(file)
+    return files
+
+
+def output_path(path_to_file: str, prefix: str = '', suffix: str = '', extension: str = None,
+                default: str = STREAM) -> str:
+    """Function to get the name of an output file derived from the name of another file,
+    by adding a prefix to the file name and a suffix before the file extension, and optionally changing the extension.
+    Compression extensions are kept, so that the output file is compressed in the same way.
+    If path_to_file is - for standard input or output, default is returned"""
+    if path_to_file == STREAM:
+        return default
+    head, tail = os.path.split(path_to_file)
+    compressed = compression(tail) or ''
+    name, ext = os.path.splitext(tail[:len(tail) - len(compressed)])
+    return os.path.join(head, f'{prefix}{name}{suffix}{ext if extension is None else extension}{compressed}')
+
+
 def timeit_wrapper(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
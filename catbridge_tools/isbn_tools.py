@@ -8,6 +8,12 @@
 # Import required modules
 import re
 
+# NumPy is optional; it is only needed by the batch functions
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 __author__ = 'Victoria Morris'
 __license__ = 'MIT License'
@@ -26,6 +32,15 @@ RE_ISBN13 = re.compile(r'\b97[89][0-9]{10}\b|'
                        r'\b(?=(?:[0-9]+[\- ]){4})97[89][\- 0-9]{13}[0-9]\b')
 
 
+# ====================
+#      Constants
+# ====================
+
+
+ISBN_10_WEIGHTS = (10, 9, 8, 7, 6, 5, 4, 3, 2)
+ISBN_13_WEIGHTS = (1, 3, 1, 3, 1, 3, 1, 3, 1, 3, 1, 3)
+
+
 # ====================
 #       Classes
 # ====================
@@ -118,4 +133,94 @@ def isbn_convert(isbn10):
     """Function to convert a 10-digit ISBN to a 13-digit ISBN"""
     if not is_isbn_10(isbn10):
         return None
+    isbn10 = re.sub(r'[^0-9X]', '', isbn10.replace('x', 'X'))
     return '978' + isbn10[:-1] + isbn_13_check_digit('978' + isbn10[:-1])
+
+
+# ====================
+#   Batch functions
+# ====================
+
+
+def _require_numpy():
+    """Function to raise an error if NumPy is not available"""
+    if np is None:
+        raise ImportError('NumPy is required for batch ISBN functions: pip install numpy')
+
+
+def _isbn_code_matrix(isbns, width=13):
+    """Function to convert a sequence of ISBN strings to a matrix of code points,
+    with the characters other than digits and X removed as in the scalar functions.
+
+    Returns the matrix of code points, with at least width columns, and the number of characters in each row"""
+    _require_numpy()
+    strings = np.asarray(isbns, dtype=str).reshape(-1)
+    size = max(strings.dtype.itemsize // 4, 1)
+    codes = np.ascontiguousarray(strings).view(np.uint32).reshape(len(strings), size)
+    codes = np.where(codes == ord('x'), np.uint32(ord('X')), codes)
+    keep = ((codes >= ord('0')) & (codes <= ord('9'))) | (codes == ord('X'))
+    # Move the retained characters to the left of each row, preserving their order
+    order = np.argsort(~keep, axis=1, kind='stable')
+    codes = np.where(np.take_along_axis(keep, order, axis=1), np.take_along_axis(codes, order, axis=1), 0)
+    if size < width:
+        codes = np.pad(codes, ((0, 0), (0, width - size)))
+    return codes.astype(np.uint32, copy=False), keep.sum(axis=1)
+
+
+def _all_digits(codes):
+    """Function to check which rows of a matrix of code points contain only digits"""
+    return ((codes >= ord('0')) & (codes <= ord('9'))).all(axis=1)
+
+
+def _isbn_10_check_codes(digits):
+    """Function to get the code points of the check digits for a matrix of 9 digits per row"""
+    tenth_digit = (11 - digits @ np.array(ISBN_10_WEIGHTS, dtype=np.int64) % 11) % 11
+    return np.where(tenth_digit == 10, ord('X'), tenth_digit + ord('0'))
+
+
+def _isbn_13_check_codes(digits):
+    """Function to get the code points of the check digits for a matrix of 12 digits per row"""
+    return (10 - digits @ np.array(ISBN_13_WEIGHTS, dtype=np.int64) % 10) % 10 + ord('0')
+
+
+def _is_isbn_10_codes(codes, length):
+    """Function to validate 10-digit ISBNs given as a matrix of code points"""
+    codes = codes[:, :10]
+    valid = (length == 10) & _all_digits(codes[:, :9])
+    check = _isbn_10_check_codes(codes[:, :9].astype(np.int64) - ord('0'))
+    return valid & (codes[:, 9] == check)
+
+
+def is_isbn_10_batch(isbns):
+    """Function to validate a sequence of 10-digit ISBNs
+
+    Returns an array of booleans matching the results of is_isbn_10"""
+    return _is_isbn_10_codes(*_isbn_code_matrix(isbns))
+
+
+def is_isbn_13_batch(isbns):
+    """Function to validate a sequence of 13-digit ISBNs
+
+    Returns an array of booleans matching the results of is_isbn_13"""
+    codes, length = _isbn_code_matrix(isbns)
+    codes = codes[:, :13]
+    valid = (length == 13) & _all_digits(codes[:, :12]) & (codes[:, 0] == ord('9')) & (codes[:, 1] == ord('7')) \
+        & ((codes[:, 2] == ord('8')) | (codes[:, 2] == ord('9')))
+    check = _isbn_13_check_codes(codes[:, :12].astype(np.int64) - ord('0'))
+    return valid & (codes[:, 12] == check)
+
+
+def isbn_convert_batch(isbns):
+    """Function to convert a sequence of 10-digit ISBNs to 13-digit ISBNs
+
+    Returns an array of validity flags and an array of 13-digit ISBNs,
+    with None wherever the input is not a valid 10-digit ISBN, matching the results of isbn_convert"""
+    codes, length = _isbn_code_matrix(isbns)
+    valid = _is_isbn_10_codes(codes, length)
+    isbn13 = np.empty((len(codes), 13), dtype=np.uint32)
+    isbn13[:, :3] = [ord('9'), ord('7'), ord('8')]
+    isbn13[:, 3:12] = codes[:, :9]
+    isbn13[:, 12] = _isbn_13_check_codes(isbn13[:, :12].astype(np.int64) - ord('0'))
+    converted = isbn13.view('U13').reshape(-1).astype(object)
+    converted[~valid] = None
+    return valid, converted
@@ -9,9 +9,15 @@
 
 # Import required modules
 import os
+import struct
+import time
 import unicodedata
+from array import array
 from catbridge_tools.functions import *
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from io import BytesIO
+from mmap import mmap as MemoryMap, ACCESS_READ
 from typing import Callable
 
 
@@ -30,6 +36,13 @@ LEADER_LENGTH, DIRECTORY_LENGTH = 24, 12
 SUBFIELD_INDICATOR, END_OF_FIELD, END_OF_RECORD = chr(0x1F), chr(0x1E), chr(0x1D)
 SUBFIELD_INDICATOR_BYTES, END_OF_FIELD_BYTES, END_OF_RECORD_BYTES = b'\x1F', b'\x1E', b'\x1D'
 ALEPH_CONTROL_FIELDS = ['DB ', 'SYS']
+# Data fields which are not repeatable in MARC 21 bibliographic records, used when merging records (see merge_union)
+NON_REPEATABLE_TAGS = {'010', '018', '040', '042', '043', '044', '045', '066', '100', '110', '111', '130',
+                       '240', '243', '245', '250', '254', '256', '263', '306', '357', '384'}
+INDEX_EXTENSION, INDEX_MAGIC, INDEX_VERSION = '.idx', b'CBIX', 1
+BLOCK_SIZE, CHUNK_SIZE, WRITE_BUFFER_SIZE = 2 ** 16, 2 ** 24, 2 ** 20
+# Shared (indicator1, indicator2) tuples, see Field.indicators
+INDICATORS = {}
 
 
 # ====================
@@ -82,6 +95,34 @@ def clean(string):
     return unicodedata.normalize('NFC', string)
 
 
+def fix_fmt(record):
+    """Function to convert FMT control fields into data fields with two blank indicators and subfield 'a'.
+    Records without an FMT control field are returned unchanged"""
+    if not any(hasattr(field, 'data') for field in record.get_fields('FMT')):
+        return record
+    output_record = Record(leader=record.leader)
+    for field in record:
+        if field.tag == 'FMT' and hasattr(field, 'data'):
+            output_record.add_field(Field(tag='FMT', indicators=[' ', ' '], subfields=['a', field.data]))
+        else:
+            output_record.add_field(field)
+    return output_record
+
+
+def get_control_field(marc, tag: str = '001'):
+    """Function to get the value of a control field from the raw data of a record,
+    reading only the directory and the field itself.
+    Returns None if the field is not present"""
+    base_address = int(bytes(marc[12:17]))
+    tag = tag.encode('ascii')
+    for entry_start in range(LEADER_LENGTH, base_address - 1, DIRECTORY_LENGTH):
+        if marc[entry_start:entry_start + 3] == tag:
+            entry = bytes(marc[entry_start:entry_start + DIRECTORY_LENGTH])
+            start = base_address + int(entry[7:12])
+            return str(marc[start:start + int(entry[3:7]) - 1], 'utf-8').strip()
+    return None
+
+
 # ====================
 #       Classes
 # ====================
@@ -89,129 +130,569 @@ def clean(string):
 
 class MARCReader(object):
 
-    def __init__(self, path_to_file):
+    def __init__(self, path_to_file, mmap=False, lazy=False, metrics=None):
         self.count = 0
         self.processed = 0
+        # path_to_file may be - for standard input, or a file object, which is not closed by the reader;
+        # compressed files are decompressed as they are read (see open_file)
         self.path_to_file = path_to_file
-        self.file_handle = open(path_to_file, mode='rb')
+        self.file_handle = open_file(path_to_file, mode='rb')
+        # The size of the file is None if it is not known, in which case progress is reported without a percentage
+        self.size = file_size(path_to_file)
         self.silent = False
+        # Timings and counts for the read and decode stages are added to metrics,
+        # which defaults to the active Metrics, if any; metrics=False disables them
+        self.metrics = Metrics.active if metrics is None else metrics or None
+        if self.metrics is not None:
+            self.metrics.start_file(file_name(path_to_file))
+        # In lazy mode records are returned as LazyRecord objects, which decode fields on demand
+        self.record_class = LazyRecord if lazy else Record
+        # In mmap mode records are handed to Record as memoryview slices over the mapped file,
+        # so that the directory and fields can be sliced without intermediate copies
+        self.record_index = None
+        self.memory_map, self.view, self.position = None, None, 0
+        if mmap and self.__sizeof__() > 0:
+            self.memory_map = MemoryMap(self.file_handle.fileno(), 0, access=ACCESS_READ)
+            self.view = memoryview(self.memory_map)
 
     def __sizeof__(self):
-        return os.path.getsize(self.path_to_file)
+        return self.size or 0
 
     def __iter__(self):
         return self
 
     def __len__(self):
         self.silent = True
-        for record in self:
-            continue
-        return self.count - 1
+        return self.count_records()
+
+    def scan(self, check_terminator=False):
+        """Generator to locate records from the current position in the file, without reading them.
+        Only the record length in the first 5 bytes of each record is read,
+        except in streams, which cannot seek past the rest of the record.
+        If check_terminator is True, the last byte of each record is checked for an END_OF_RECORD byte.
+        Yields (offset, length) tuples"""
+        seekable = self.file_handle.seekable()
+        offset = self.file_handle.tell() if seekable else 0
+        while True:
+            first5 = self.file_handle.read(5)
+            if not first5:
+                return
+            if len(first5) < 5 or not first5.isdigit() or int(first5) <= LEADER_LENGTH:
+                raise RecordLengthError
+            length = int(first5)
+            if not seekable:
+                rest = self.file_handle.read(length - 5)
+                if check_terminator and not rest.endswith(END_OF_RECORD_BYTES):
+                    raise RecordLengthError
+            elif check_terminator:
+                self.file_handle.seek(offset + length - 1)
+                if self.file_handle.read(1) != END_OF_RECORD_BYTES:
+                    raise RecordLengthError
+            else:
+                self.file_handle.seek(offset + length)
+            yield offset, length
+            offset += length
+
+    def count_records(self, check_terminator=False) -> int:
+        """Function to count the records in the file without decoding them.
+        The position of the reader within the file is not changed,
+        except for streams, where the records from the current position are counted"""
+        if not self.file_handle.seekable():
+            return sum(1 for _ in self.scan(check_terminator=check_terminator))
+        position = self.file_handle.tell()
+        self.file_handle.seek(0)
+        try:
+            return sum(1 for _ in self.scan(check_terminator=check_terminator))
+        finally:
+            self.file_handle.seek(position)
 
     def close(self):
         self.count -= 1
         if not self.silent:
             log_print(f'100% [{str(self.count)} records] processed')
+        if self.metrics is not None:
+            self.metrics.end_file()
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        if self.memory_map is not None:
+            try:
+                self.memory_map.close()
+            except BufferError:
+                # Slices of the map are still referenced elsewhere;
+                # the map will be closed when they are garbage collected
+                pass
+            self.memory_map = None
+        if self.record_index is not None:
+            self.record_index.close()
+            self.record_index = None
         if self.file_handle:
-            self.file_handle.close()
+            if self.file_handle is not self.path_to_file:
+                self.file_handle.close()
             self.file_handle = None
 
-    def __next__(self):
-        self.count += 1
+    def get_index(self) -> 'RecordIndex':
+        """Function to get the index for the file, building it if it is missing or out of date"""
+        if self.record_index is None:
+            self.record_index = RecordIndex(self.path_to_file)
+        if not self.record_index.open():
+            self.record_index.build()
+            self.record_index.open()
+        return self.record_index
+
+    def seek_record(self, n: int):
+        """Function to get record n (counting from 0) using the index for the file.
+        Iteration continues from the following record"""
+        offset = self.get_index().get_offset(n)
+        self.file_handle.seek(offset)
+        self.position, self.processed, self.count = offset, offset, n
+        return next(self)
+
+    def get_by_id(self, record_id: str):
+        """Function to get the first record with the given record ID in field 001,
+        using the index for the file. Returns None if there is no such record.
+        Iteration continues from the following record"""
+        n = self.get_index().find(record_id)
+        if n is None:
+            return None
+        return self.seek_record(n)
+
+    def read_marc(self):
+        """Function to read the raw data for the next record.
+        Returns a memoryview in mmap mode, bytes otherwise, or None at the end of the file"""
+        if self.view is not None:
+            first5 = self.view[self.position:self.position + 5]
+            if not first5:
+                return None
+            # The position only advances by the record length, so an invalid length must not be used,
+            # or the same record would be read repeatedly; a record shorter than its length is truncated
+            first5 = bytes(first5)
+            if len(first5) < 5 or not first5.isdigit() or int(first5) <= LEADER_LENGTH:
+                raise RecordLengthError
+            length = int(first5)
+            data = self.view[self.position:self.position + length]
+            if len(data) < length:
+                raise RecordLengthError
+            self.position += length
+            return data
         first5 = self.file_handle.read(5)
         if not first5:
-            raise StopIteration
+            return None
         if len(first5) < 5:
             raise RecordLengthError
-        self.processed += int(first5)
+        return first5 + self.file_handle.read(int(first5) - 5)
+
+    def __next__(self):
+        self.count += 1
+        start = time.perf_counter() if self.metrics is not None else None
+        data = self.read_marc()
+        if data is None:
+            raise StopIteration
+        self.processed += len(data)
         if not self.silent:
             if self.count % 1000 == 0:
-                print(f'{str(int(100*self.processed / self.__sizeof__()))}% [{str(self.count)} records] processed',
-                      end='\r')
+                if self.size:
+                    print(f'{str(int(100*self.processed / self.size))}% [{str(self.count)} records] processed',
+                          end='\r')
+                else:
+                    print(f'[{str(self.count)} records] processed', end='\r')
                 if self.count % 100000 == 0:
                     gc.collect()
-        return Record(first5 + self.file_handle.read(int(first5) - 5))
+        if start is None:
+            return self.record_class(data)
+        read = time.perf_counter()
+        record = self.record_class(data)
+        self.metrics.add('read', read - start, size=len(data))
+        self.metrics.add('decode', time.perf_counter() - read, fields=len(record._fields))
+        return record
 
 
 class MARCReaderTentative(MARCReader):
 
-    def __int__(self, path_to_file):
-        super().__init__(path_to_file)
+    def __init__(self, path_to_file, metrics=None):
+        super().__init__(path_to_file, metrics=metrics)
+        # Data read beyond the end of a flawed record, to be read again as the start of the next record,
+        # so that records can be resynchronised without seeking backwards in streams and compressed files
+        self.unread = b''
 
     def __next__(self):
+        status, error, data = self.next_tentative()
+        if not status:
+            return False, f'Error at record {str(self.count)}: {error}', data
+        return True, None, Record(data)
+
+    def next_tentative(self):
+        """Function to read and check the next record, without decoding it.
+        Returns a tuple (status, error, data) as read_tentative, adding the time taken to metrics"""
+        if self.metrics is None:
+            return self.read_tentative()
+        start = time.perf_counter()
+        status, error, data = self.read_tentative()
+        self.metrics.add('read', time.perf_counter() - start, size=len(data))
+        if not status:
+            self.metrics.count_error()
+        return status, error, data
+
+    def read_tentative(self):
+        """Function to read and check the next record, without decoding it.
+        Returns a tuple (status, error, data), where error describes the flaw in the record if status is False,
+        and data is the bytes of the record"""
         self.count += 1
-        first5 = self.file_handle.read(5)
+        # Data is only read through self.read while there is data left over from a flawed record
+        read = self.read if self.unread else self.file_handle.read
+        first5 = read(5)
         if not first5:
             raise StopIteration
         if len(first5) < 5:
-            return False, (f'Error at record {str(self.count)}: '
-                           f'Invalid record length in first 5 bytes of record'), b''
+            return False, 'Invalid record length in first 5 bytes of record', b''
         self.processed += int(first5)
-        data = self.file_handle.read(int(first5) - 5)
+        data = first5 + read(int(first5) - 5)
         if not data.endswith(END_OF_RECORD_BYTES):
-            if END_OF_RECORD_BYTES in data:
-                data, new_record = data.split(END_OF_RECORD_BYTES, 1)
-                data += END_OF_RECORD_BYTES
-                self.file_handle.seek(-1 * len(new_record), 1)
-            while END_OF_RECORD_BYTES not in data:
-                data += self.file_handle.read(1)
-            return False, (f'Error at record {str(self.count)}: '
-                           f'Record length does not match length specified in first 5 bytes of record: '
-                           f'specified length {str(int(first5))}; observed {str(len(data) + 5)}'), first5 + data
-        tentative = RecordTentative(first5 + data)
-        valid, message = tentative.decode_marc()
+            # Resynchronise at the first END_OF_RECORD byte, searching forward in blocks if there is none in the data
+            end = data.find(END_OF_RECORD_BYTES, 5)
+            if end >= 0:
+                # The data may have been read from the start of self.unread, so what is left of it follows
+                self.unread = data[end + 1:] + self.unread
+                data = data[:end + 1]
+            else:
+                blocks = [data]
+                while True:
+                    block = self.read(BLOCK_SIZE)
+                    end = block.find(END_OF_RECORD_BYTES)
+                    if end >= 0:
+                        self.unread = block[end + 1:] + self.unread
+                        block = block[:end + 1]
+                    blocks.append(block)
+                    if not block or end >= 0:
+                        break
+                data = b''.join(blocks)
+            return False, (f'Record length does not match length specified in first 5 bytes of record: '
+                           f'specified length {str(int(first5))}; observed {str(len(data))}'), data
+        valid, message = RecordTentative(data).decode_marc()
         if not valid:
-            return False, f'Error at record {str(self.count)}: {message}', first5 + data
-        return valid, None, Record(first5 + data)
+            return False, message, data
+        return True, None, data
+
+    def read(self, size: int) -> bytes:
+        """Function to read up to size bytes, starting with any data read beyond the end of a flawed record"""
+        if not self.unread:
+            return self.file_handle.read(size)
+        data, self.unread = self.unread[:size], self.unread[size:]
+        if len(data) < size:
+            data += self.file_handle.read(size - len(data))
+        return data
+
+    def tell(self) -> int:
+        """Function to get the offset in the file at which the next record begins"""
+        return self.file_handle.tell() - len(self.unread)
 
 
 class MARCWriter(object):
 
-    def __init__(self, path_to_file):
+    def __init__(self, path_to_file, buffer_size=WRITE_BUFFER_SIZE, metrics=None):
         self.count = 0
         self.processed = 0
+        # path_to_file may be - for standard output, or a file object, which is flushed but not closed by the writer;
+        # compressed files are compressed as they are written (see open_file)
         self.path_to_file = path_to_file
-        self.file_handle = open(path_to_file, mode='wb')
+        self.file_handle = open_file(path_to_file, mode='wb')
         self.silent = False
+        # Timings and counts for the encode and write stages are added to metrics,
+        # which defaults to the active Metrics, if any; metrics=False disables them
+        self.metrics = Metrics.active if metrics is None else metrics or None
+        # Records are held in memory until buffer_size bytes have accumulated,
+        # and then written to the file in a single write
+        self.buffer_size = buffer_size
+        self.buffer, self.buffered = [], 0
 
     def write(self, record):
         if not isinstance(record, Record):
             raise RecordWritingError
-        self.file_handle.write(record.as_marc())
+        if self.metrics is None:
+            data = record.as_marc()
+        else:
+            start = time.perf_counter()
+            data = record.as_marc()
+            self.metrics.add('encode', time.perf_counter() - start, size=len(data))
+        self.write_marc(data)
+
+    def write_marc(self, data: bytes):
+        """Function to write the raw data for a record, which is not checked"""
+        self.buffer.append(data)
+        self.buffered += len(data)
+        self.count += 1
+        self.processed += len(data)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def write_block(self, data, records: int):
+        """Function to write the raw data of a number of consecutive records, which is not checked,
+        directly to the file without copying it into the buffer"""
+        self.flush()
+        start = time.perf_counter()
+        self.file_handle.write(data)
+        self.count += records
+        self.processed += len(data)
+        if self.metrics is not None:
+            self.metrics.add('write', time.perf_counter() - start, records=records, size=len(data))
+
+    def flush(self):
+        if self.buffer:
+            start = time.perf_counter()
+            self.file_handle.write(b''.join(self.buffer))
+            if self.metrics is not None:
+                self.metrics.add('write', time.perf_counter() - start, records=len(self.buffer), size=self.buffered)
+            self.buffer, self.buffered = [], 0
+
+    def close(self):
+        if self.file_handle:
+            self.flush()
+            if self.file_handle is self.path_to_file:
+                self.file_handle.flush()
+            else:
+                self.file_handle.close()
+            self.file_handle = None
+
+
+class RecordIndex(object):
+    """Index of the records within a file of MARC records, held in a sidecar file.
+
+    The index holds the offset and length of each record, and the record IDs from field 001 in sorted order.
+    It is only valid while the size and modification time of the indexed file are unchanged.
+
+    Layout of the sidecar file (little-endian):
+        header
+        offsets of records (8 bytes per record)
+        lengths of records (4 bytes per record)
+        ID entries, sorted by ID (position in ID data, length of ID, record number)
+        ID data (UTF-8)"""
+
+    HEADER = struct.Struct('<4sHQqQQ')
+    ID_ENTRY = struct.Struct('<QHQ')
+
+    def __init__(self, path_to_file):
+        self.path_to_file = path_to_file
+        self.path_to_index = path_to_file + INDEX_EXTENSION
+        self.record_total, self.id_total = 0, 0
+        self.file_handle, self.memory_map = None, None
+        self.size, self.mtime = None, None
+
+    def __len__(self):
+        return self.record_total
 
     def close(self):
+        if self.memory_map is not None:
+            self.memory_map.close()
+            self.memory_map = None
         if self.file_handle:
             self.file_handle.close()
             self.file_handle = None
 
+    def open(self) -> bool:
+        """Function to open the sidecar file.
+        Returns False if it is missing or does not match the current state of the indexed file"""
+        stat = os.stat(self.path_to_file)
+        if self.memory_map is not None:
+            if (stat.st_size, stat.st_mtime_ns) == (self.size, self.mtime):
+                return True
+            self.close()
+        if not os.path.isfile(self.path_to_index):
+            return False
+        self.file_handle = open(self.path_to_index, mode='rb')
+        header = self.file_handle.read(self.HEADER.size)
+        if len(header) == self.HEADER.size:
+            magic, version, size, mtime, self.record_total, self.id_total = self.HEADER.unpack(header)
+            if (magic, version, size, mtime) == (INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns):
+                self.memory_map = MemoryMap(self.file_handle.fileno(), 0, access=ACCESS_READ)
+                self.size, self.mtime = size, mtime
+                return True
+        logging.info(f'Index {self.path_to_index} is out of date')
+        self.close()
+        return False
+
+    def build(self):
+        """Function to build the sidecar file by reading every record in the indexed file"""
+        log_print(f'Building index for {os.path.basename(self.path_to_file)}')
+        self.close()
+        stat = os.stat(self.path_to_file)
+        offsets, lengths, ids = array('Q'), array('I'), []
+        reader = MARCReader(self.path_to_file)
+        reader.silent = True
+        offset = 0
+        data = reader.read_marc()
+        while data is not None:
+            try:
+                record_id = get_control_field(data)
+            except (ValueError, UnicodeDecodeError):
+                logging.warning(f'Could not read record ID of record {str(len(offsets) + 1)} '
+                                f'in {self.path_to_file}')
+                record_id = None
+            if record_id:
+                ids.append((record_id.encode('utf-8'), len(offsets)))
+            offsets.append(offset)
+            lengths.append(len(data))
+            offset += len(data)
+            data = reader.read_marc()
+        reader.close()
+        ids.sort()
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+            lengths.byteswap()
+
+        temporary_path = f'{self.path_to_index}.tmp'
+        with open(temporary_path, mode='wb') as file_handle:
+            file_handle.write(self.HEADER.pack(INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns,
+                                               len(offsets), len(ids)))
+            file_handle.write(offsets.tobytes())
+            file_handle.write(lengths.tobytes())
+            position = 0
+            for record_id, n in ids:
+                file_handle.write(self.ID_ENTRY.pack(position, len(record_id), n))
+                position += len(record_id)
+            for record_id, n in ids:
+                file_handle.write(record_id)
+        os.replace(temporary_path, self.path_to_index)
+
+    def get_offset(self, n: int) -> int:
+        """Function to get the offset of record n (counting from 0) within the indexed file"""
+        if not 0 <= n < self.record_total:
+            raise KeyError(f'Record {str(n)} is not present in {self.path_to_file}')
+        return struct.unpack_from('<Q', self.memory_map, self.HEADER.size + 8 * n)[0]
+
+    def get_length(self, n: int) -> int:
+        """Function to get the length of record n (counting from 0)"""
+        if not 0 <= n < self.record_total:
+            raise KeyError(f'Record {str(n)} is not present in {self.path_to_file}')
+        return struct.unpack_from('<I', self.memory_map, self.HEADER.size + 8 * self.record_total + 4 * n)[0]
+
+    def get_id(self, i: int) -> bytes:
+        """Function to get the ith record ID in sorted order"""
+        entries = self.HEADER.size + 12 * self.record_total
+        position, length, n = self.ID_ENTRY.unpack_from(self.memory_map, entries + self.ID_ENTRY.size * i)
+        position += entries + self.ID_ENTRY.size * self.id_total
+        return self.memory_map[position:position + length]
+
+    def find(self, record_id: str):
+        """Function to find the number of the first record with the given record ID, by binary search.
+        Returns None if there is no such record"""
+        record_id = record_id.strip().encode('utf-8')
+        low, high = 0, self.id_total
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_id(middle) < record_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.id_total or self.get_id(low) != record_id:
+            return None
+        entries = self.HEADER.size + 12 * self.record_total
+        return self.ID_ENTRY.unpack_from(self.memory_map, entries + self.ID_ENTRY.size * low)[2]
+
+
+class RecordMap(object):
+    """Map from the record IDs in field 001 to the offsets of the records within a file of MARC records,
+    held in memory, so that the records with a given ID can be read without holding the records themselves.
+
+    Memory use is proportional to the number of records rather than to their size.
+    Since most IDs occur only once in a file, a single offset is stored as an int,
+    and the offsets of repeated IDs as a tuple, in file order.
+    The file must be seekable, since records are read again by offset"""
+
+    def __init__(self, path_to_file):
+        self.path_to_file = path_to_file
+        self.reader = MARCReader(path_to_file)
+        self.reader.silent = True
+        if not self.reader.file_handle.seekable():
+            self.reader.close()
+            raise CBError(f'Error: records cannot be read by ID from {file_name(path_to_file)}')
+        self.offsets, self.count = {}, 0
+        # Offsets of records without a record ID, which cannot be looked up
+        self.unidentified = []
+        offset = 0
+        data = self.reader.read_marc()
+        while data is not None:
+            try:
+                record_id = get_control_field(data)
+            except (ValueError, UnicodeDecodeError):
+                logging.warning(f'Could not read record ID of record {str(self.count + 1)} '
+                                f'in {file_name(path_to_file)}')
+                record_id = None
+            if record_id:
+                offsets = self.offsets.get(record_id)
+                if offsets is None:
+                    self.offsets[record_id] = offset
+                elif isinstance(offsets, int):
+                    self.offsets[record_id] = (offsets, offset)
+                else:
+                    self.offsets[record_id] = offsets + (offset,)
+            else:
+                self.unidentified.append(offset)
+            self.count += 1
+            offset += len(data)
+            data = self.reader.read_marc()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, record_id: str):
+        return record_id in self.offsets
+
+    def __iter__(self):
+        # Record IDs are returned in the order in which they first occur in the file
+        return iter(self.offsets)
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def read(self, offset: int) -> bytes:
+        """Function to read the raw data for the record at the given offset"""
+        self.reader.file_handle.seek(offset)
+        return self.reader.read_marc()
+
+    def get(self, record_id: str) -> list:
+        """Function to get the raw data for all the records with the given record ID, in file order"""
+        offsets = self.offsets.get(record_id, ())
+        return [self.read(offset) for offset in ((offsets,) if isinstance(offsets, int) else offsets)]
+
 
 class Record(object):
+    __slots__ = ('leader', '_fields', 'pos', 'raw', 'raw_leader', 'raw_fields', 'tag_index')
+
     def __init__(self, data: bytes = None, leader=' ' * LEADER_LENGTH):
         self.leader = '{}22{}4500'.format(leader[0:10], leader[12:20])
         self.fields = list()
         self.pos = 0
+        # The data the record was decoded from, with its leader and fields as decoded,
+        # so that an unmodified record can be written without encoding it again
+        self.raw, self.raw_leader, self.raw_fields = None, None, []
         if data and len(data) > 0:
             self.decode_marc(data)
 
+    @property
+    def fields(self):
+        return self._fields
+
+    @fields.setter
+    def fields(self, fields):
+        # The positions of the fields with each tag are indexed when they are first needed,
+        # and the index is then kept in sync by add_field.
+        # Fields should therefore be added using add_field rather than by changing the list in place
+        self._fields = fields
+        self.tag_index = None
+
     def __getitem__(self, tag):
-        fields = self.get_fields(tag)
-        if len(fields) > 0:
-            return fields[0]
+        positions = self.get_positions(tag)
+        if len(positions) > 0:
+            return self.get_field(positions[0])
         return None
 
     def __contains__(self, tag):
-        fields = self.get_fields(tag)
-        return len(fields) > 0
+        return len(self.get_positions(tag)) > 0
 
     def __iter__(self):
-        self.__pos = 0
-        return self
-
-    def __next__(self):
-        if self.__pos >= len(self.fields):
-            raise StopIteration
-        self.__pos += 1
-        return self.fields[self.__pos - 1]
+        return map(self.get_field, range(len(self._fields)))
 
     def __repr__(self):
         text_list = ['=LDR  {}'.format(self.leader)]
@@ -219,31 +700,87 @@ class Record(object):
         return '\n'.join(text_list) + '\n'
 
     def __sizeof__(self):
-        return len(self.get_fields())
+        return len(self._fields)
+
+    def get_field(self, i: int) -> 'Field':
+        """Function to get the field at position i"""
+        return self._fields[i]
+
+    def get_tag_index(self) -> dict:
+        """Function to get the index of the positions of the fields with each tag"""
+        if self.tag_index is None:
+            self.build_tag_index(field.tag for field in self._fields)
+        return self.tag_index
+
+    def build_tag_index(self, tags):
+        """Function to build the tag index from the tags of the fields, in record order"""
+        self.tag_index = {}
+        for i, tag in enumerate(tags):
+            self.index_field(tag, i)
+
+    def index_field(self, tag: str, i: int):
+        """Function to add the field at position i to the tag index.
+        Since most tags occur only once in a record, a single position is stored as an int,
+        and repeated positions as a tuple"""
+        positions = self.tag_index.get(tag)
+        if positions is None:
+            self.tag_index[tag] = i
+        elif isinstance(positions, int):
+            self.tag_index[tag] = (positions, i)
+        else:
+            self.tag_index[tag] = positions + (i,)
+
+    def get_positions(self, *tags) -> tuple:
+        """Function to get the positions of the fields with any of the specified tags, in record order"""
+        tag_index = self.get_tag_index()
+        if len(tags) == 1:
+            positions = tag_index.get(tags[0], ())
+            return (positions,) if isinstance(positions, int) else positions
+        return tuple(sorted(i for tag in set(tags) for i in self.get_positions(tag)))
 
     def get_fields(self, *args, indicators=None):
         if len(args) == 0:
             return self.fields
+        fields = [self.get_field(i) for i in self.get_positions(*args)]
         if not indicators:
-            return [f for f in self.fields if f.tag in args]
-        return [f for f in self.fields if f.tag in args
-                and (indicators[0] == '*' or f.indicators[0].replace('#', ' ') in ['*', indicators[0].replace('#', ' ')])
-                and (indicators[1] == '*' or f.indicators[1].replace('#', ' ') in ['*', indicators[1].replace('#', ' ')])]
+            return fields
+        return [f for f in fields if self.match_indicators(f, indicators)]
 
-    def add_field(self, *fields):
-        self.fields.extend(fields)
+    @staticmethod
+    def match_indicators(field, indicators) -> bool:
+        """Function to test whether the indicators of a field match a pair of indicators,
+        where * matches any value and # is equivalent to a blank space"""
+        indicator1, indicator2 = field.normalized_indicators
+        return ((indicators[0] == '*' or indicator1 in ['*', indicators[0].replace('#', ' ')])
+                and (indicators[1] == '*' or indicator2 in ['*', indicators[1].replace('#', ' ')]))
 
-    def decode_marc(self, marc):
+    def add_field(self, *fields):
+        self.get_tag_index()
+        for field in fields:
+            self.index_field(field.tag, len(self._fields))
+            self._fields.append(field)
+
+    def remove_field(self, *fields):
+        """Function to remove fields from the record. Fields are matched by identity rather than by value"""
+        fields = {id(field) for field in fields}
+        self.fields = [field for field in self.fields if id(field) not in fields]
+
+    def read_directory(self, marc) -> list:
+        """Function to read the leader and directory of a record.
+        Returns a list of (tag, start, end) tuples giving the position of the data for each field,
+        excluding its END_OF_FIELD byte"""
+        # marc may be bytes or a memoryview (see MARCReader mmap mode),
+        # so slices are converted with str() and bytes() rather than bytes methods
         # Extract record leader
         try:
-            self.leader = marc[0:LEADER_LENGTH].decode('ascii')
+            self.leader = str(marc[0:LEADER_LENGTH], 'ascii')
         except Exception as err:
             logging.warning(f'Encountered record with Leader that could not be processed: {err}')
         if len(self.leader) != LEADER_LENGTH:
             raise LeaderError
 
         # Extract the byte offset where the record data starts
-        base_address = int(marc[12:17])
+        base_address = int(bytes(marc[12:17]))
         if base_address <= 0:
             raise BaseAddressError
         if base_address >= len(marc):
@@ -251,92 +788,107 @@ class Record(object):
 
         # Extract directory
         # base_address-1 is used since the directory ends with an END_OF_FIELD byte
-        directory = marc[LEADER_LENGTH:base_address - 1].decode('ascii')
+        directory = str(marc[LEADER_LENGTH:base_address - 1], 'ascii')
 
         # Determine the number of fields in record
         if len(directory) % DIRECTORY_LENGTH != 0:
             raise DirectoryError
-        field_total = len(directory) / DIRECTORY_LENGTH
 
-        # Add fields to record using directory offsets
-        field_count = 0
-        while field_count < field_total:
-            entry_start = field_count * DIRECTORY_LENGTH
-            entry_end = entry_start + DIRECTORY_LENGTH
-            entry = directory[entry_start:entry_end]
-            entry_tag = entry[0:3]
-            entry_length = int(entry[3:7])
-            entry_offset = int(entry[7:12])
-            entry_data = marc[base_address + entry_offset:base_address + entry_offset + entry_length - 1]
-
-            # Check if tag is a control field
-            if str(entry_tag) < '010' and entry_tag.isdigit():
-                field = Field(tag=entry_tag, data=entry_data.decode('utf-8'))
-            elif str(entry_tag) in ALEPH_CONTROL_FIELDS:
-                field = Field(tag=entry_tag, data=entry_data.decode('utf-8'))
-            elif SUBFIELD_INDICATOR.encode('ascii') not in entry_data:
-                field = Field(tag=entry_tag, data=entry_data.decode('utf-8'))
-            else:
-                subfields = list()
-                subs = entry_data.split(SUBFIELD_INDICATOR.encode('ascii'))
-                # Missing indicators are recorded as blank spaces.
-                # Extra indicators are ignored.
-                try:
-                    subs[0] = subs[0].decode('ascii') + '  '
-                except Exception:
-                    subs[0] = '   '
-                first_indicator, second_indicator = subs[0][0], subs[0][1]
-
-                for subfield in subs[1:]:
-                    if len(subfield) == 0:
-                        continue
-                    try:
-                        code, data = subfield[0:1].decode('ascii'), subfield[1:].decode('utf-8', 'strict')
-                    except Exception:
-                        pass
-                    else:
-                        subfields.append(code)
-                        subfields.append(data)
-                field = Field(
-                    tag=entry_tag,
-                    indicators=[first_indicator, second_indicator],
-                    subfields=subfields,
-                )
-            self.add_field(field)
-            field_count += 1
-
-        if field_count == 0:
+        entries = []
+        for entry_start in range(0, len(directory), DIRECTORY_LENGTH):
+            entry = directory[entry_start:entry_start + DIRECTORY_LENGTH]
+            start = base_address + int(entry[7:12])
+            entries.append((sys.intern(entry[0:3]), start, start + int(entry[3:7]) - 1))
+        if len(entries) == 0:
             raise FieldsError
+        return entries
 
-    def as_marc(self):
-        fields, directory = b'', b''
-        offset = 0
+    def decode_marc(self, marc):
+        # Add fields to record using directory offsets
+        entries = self.read_directory(marc)
+        self.fields = [decode_field(tag, marc[start:end]) for tag, start, end in entries]
+        self.build_tag_index(entry[0] for entry in entries)
+        self.raw, self.raw_leader, self.raw_fields = marc, self.leader, list(self.fields)
+
+    def is_modified(self) -> bool:
+        """Function to test whether the record has been changed since it was decoded.
+        Records which were not decoded from MARC data are always treated as modified"""
+        if self.raw is None or self.leader != self.raw_leader or len(self.fields) != len(self.raw_fields):
+            return True
+        return any(f is not r or f.raw is None for f, r in zip(self.fields, self.raw_fields))
 
-        for field in self.fields:
-            field_data = field.as_marc()
-            fields += field_data
+    def as_marc(self):
+        if not self.is_modified():
+            return bytes(self.raw)
+        # Each part of the record is encoded once, and the parts are joined in a single allocation
+        fields = [field.as_marc() for field in self.fields]
+        directory, offset = [], 0
+        for field, field_data in zip(self.fields, fields):
             if field.tag.isdigit():
-                directory += ('%03d' % int(field.tag)).encode('utf-8')
+                directory.append('%03d%04d%05d' % (int(field.tag), len(field_data), offset))
             else:
-                directory += ('%03s' % field.tag).encode('utf-8')
-            directory += ('%04d%05d' % (len(field_data), offset)).encode('utf-8')
+                directory.append('%03s%04d%05d' % (field.tag, len(field_data), offset))
             offset += len(field_data)
-
-        directory += END_OF_FIELD.encode('utf-8')
-        fields += END_OF_RECORD.encode('utf-8')
+        directory.append(END_OF_FIELD)
+        directory = ''.join(directory).encode('utf-8')
         base_address = LEADER_LENGTH + len(directory)
-        record_length = base_address + len(fields)
-        strleader = '%05d%s%05d%s' % (record_length, self.leader[5:12], base_address, self.leader[17:])
-        leader = strleader.encode('utf-8')
-        return leader + directory + fields
+        record_length = base_address + offset + len(END_OF_RECORD_BYTES)
+        leader = ('%05d%s%05d%s' % (record_length, self.leader[5:12], base_address, self.leader[17:])).encode('utf-8')
+        return b''.join([leader, directory] + fields + [END_OF_RECORD_BYTES])
 
     def id(self) -> str:
-        try:
-            self.id = self['001'].data.strip()
-        except KeyError:
-            logging.warning(f'Record lacking record id with title {str(self["245"]) or "[No title either!]"}')
-            self.id = '[No record ID]'
-        return self.id
+        field = self['001']
+        if field is None or not hasattr(field, 'data'):
+            logging.warning(f'Record lacking record id with title {str(self["245"] or "[No title either!]")}')
+            return '[No record ID]'
+        return field.data.strip()
+
+
+class LazyRecord(Record):
+    """Record which decodes its fields on demand.
+
+    Only the leader and directory are read when the record is created;
+    each field is decoded the first time it is requested"""
+    __slots__ = ('entries',)
+
+    def __init__(self, data: bytes = None, leader=' ' * LEADER_LENGTH):
+        self.entries = []
+        super().__init__(data, leader)
+
+    @property
+    def fields(self):
+        for i, field in enumerate(self._fields):
+            if field is None:
+                self.decode_entry(i)
+        return self._fields
+
+    @fields.setter
+    def fields(self, fields):
+        self.raw, self.raw_fields = None, []
+        self.entries = []
+        Record.fields.fset(self, fields)
+
+    def get_field(self, i: int) -> 'Field':
+        return self._fields[i] or self.decode_entry(i)
+
+    def decode_marc(self, marc):
+        self.entries = self.read_directory(marc)
+        self._fields = [None] * len(self.entries)
+        # The tag index is built from the directory, so that no fields need to be decoded to find them
+        self.build_tag_index(entry[0] for entry in self.entries)
+        self.raw, self.raw_leader, self.raw_fields = marc, self.leader, [None] * len(self.entries)
+
+    def decode_entry(self, i: int) -> 'Field':
+        """Function to decode the field at position i in the directory"""
+        tag, start, end = self.entries[i]
+        self._fields[i] = self.raw_fields[i] = decode_field(tag, self.raw[start:end])
+        return self._fields[i]
+
+    def is_modified(self) -> bool:
+        # Fields which have not been decoded cannot have been modified
+        if self.raw is None or self.leader != self.raw_leader or len(self._fields) != len(self.raw_fields):
+            return True
+        return any(f is not r or (f is not None and f.raw is None) for f, r in zip(self._fields, self.raw_fields))
 
 
 class RecordTentative(object):
@@ -380,25 +932,22 @@ class RecordTentative(object):
                            f'length {str(len(directory))} is not a multiple of {str(DIRECTORY_LENGTH)}')
         field_total = len(directory) / DIRECTORY_LENGTH
 
-        directory = self.data[LEADER_LENGTH:base_address]
-        if not directory.endswith(END_OF_FIELD_BYTES):
+        # The directory and fields are checked in place using offsets into the data, without slicing
+        data = self.data
+        if not data.endswith(END_OF_FIELD_BYTES, LEADER_LENGTH, base_address):
             return False, f'Directory does not end with end-of-field character ({str(END_OF_FIELD_BYTES)})'
 
-        # Add fields to record using directory offsets
+        # Check each field using directory offsets
         field_count = 0
         while field_count < field_total:
-            entry_start = field_count * DIRECTORY_LENGTH
-            entry_end = entry_start + DIRECTORY_LENGTH
-            entry = directory[entry_start:entry_end]
-            entry_tag = entry[0:3]
-            entry_length = int(entry[3:7])
-            entry_offset = int(entry[7:12])
-            entry_data = self.data[base_address + entry_offset:base_address + entry_offset + entry_length]
-            if not entry_data.endswith(END_OF_FIELD_BYTES):
-                return False, (f'Field {str(field_count + 1)} with tag {str(entry_tag.decode("ascii"))} '
+            entry = LEADER_LENGTH + field_count * DIRECTORY_LENGTH
+            entry_start = base_address + int(data[entry + 7:entry + 12])
+            entry_end = entry_start + int(data[entry + 3:entry + 7])
+            if not data.endswith(END_OF_FIELD_BYTES, entry_start, entry_end):
+                return False, (f'Field {str(field_count + 1)} with tag {str(data[entry:entry + 3].decode("ascii"))} '
                                f'does not end with end-of-field character ({str(END_OF_FIELD_BYTES)})')
-            if END_OF_FIELD_BYTES in self.data[base_address + entry_offset:base_address + entry_offset + entry_length -1]:
-                return False, (f'Field {str(field_count + 1)} with tag {str(entry_tag.decode("ascii"))} '
+            if data.find(END_OF_FIELD_BYTES, entry_start, entry_end - 1) >= 0:
+                return False, (f'Field {str(field_count + 1)} with tag {str(data[entry:entry + 3].decode("ascii"))} '
                                f'contains unexpected end-of-field character ({str(END_OF_FIELD_BYTES)})')
             field_count += 1
 
@@ -408,13 +957,13 @@ class RecordTentative(object):
 
 
 class Field(object):
+    __slots__ = ('_tag', '_data', '_indicators', '_normalized_indicators', '_subfields', 'raw')
 
-    def __init__(self, tag, indicators=None, subfields=None, data=''):
+    def __init__(self, tag, indicators=None, subfields=None, data='', raw=None):
         if indicators is None:
             indicators = []
         if subfields is None:
             subfields = []
-        indicators = [str(x) for x in indicators]
 
         # Normalize tag to three digits
         self.tag = '%03s' % tag
@@ -427,12 +976,90 @@ class Field(object):
         elif data != '' and not subfields:
             self.data = str(data)
         else:
-            self.indicator1, self.indicator2 = self.indicators = indicators
+            self.indicators = indicators
             self.subfields = subfields
 
+        # The data the field was decoded from, excluding the END_OF_FIELD byte.
+        # This is discarded as soon as the field is changed, so it is only present while the field is unmodified.
+        # Indicators and subfields are stored as tuples, so they can only be changed through their setters
+        self.raw = raw
+
+    @property
+    def tag(self):
+        return self._tag
+
+    @tag.setter
+    def tag(self, tag):
+        self._tag = sys.intern(tag)
+        self.raw = None
+
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self.raw = None
+
+    @property
+    def indicators(self):
+        return self._indicators
+
+    @indicators.setter
+    def indicators(self, indicators):
+        indicator1, indicator2 = indicators
+        indicators = (sys.intern(str(indicator1)), sys.intern(str(indicator2)))
+        # The indicators with # replaced by a blank space are stored for matching.
+        # Fields with the same single-character indicators share the same tuples
+        if indicators in INDICATORS:
+            self._indicators, self._normalized_indicators = INDICATORS[indicators]
+        else:
+            normalized_indicators = tuple(i.replace('#', ' ') for i in indicators)
+            if normalized_indicators == indicators:
+                normalized_indicators = indicators
+            if len(indicators[0]) == len(indicators[1]) == 1:
+                INDICATORS[indicators] = (indicators, normalized_indicators)
+            self._indicators, self._normalized_indicators = indicators, normalized_indicators
+        self.raw = None
+
+    @property
+    def indicator1(self):
+        return self._indicators[0]
+
+    @indicator1.setter
+    def indicator1(self, indicator):
+        self.indicators = (indicator, self._indicators[1])
+
+    @property
+    def indicator2(self):
+        return self._indicators[1]
+
+    @indicator2.setter
+    def indicator2(self, indicator):
+        self.indicators = (self._indicators[0], indicator)
+
+    @property
+    def normalized_indicators(self) -> tuple:
+        """The indicators with # replaced by a blank space"""
+        return self._normalized_indicators
+
+    @property
+    def subfields(self):
+        return self._subfields
+
+    @subfields.setter
+    def subfields(self, subfields):
+        # Subfields are stored as a flat tuple of alternating codes and values
+        subfields = list(subfields)
+        subfields[0::2] = map(sys.intern, subfields[0::2])
+        self._subfields = tuple(subfields)
+        self.raw = None
+
     def __iter__(self):
-        self.__pos = 0
-        return self
+        if not hasattr(self, '_subfields'):
+            return iter(())
+        return zip(self._subfields[0::2], self._subfields[1::2])
 
     def __getitem__(self, subfield):
         subfields = self.get_subfields(subfield)
@@ -444,20 +1071,11 @@ class Field(object):
         subfields = self.get_subfields(subfield)
         return len(subfields) > 0
 
-    def __next__(self):
-        if not hasattr(self, 'subfields'):
-            raise StopIteration
-        while self.__pos + 1 < len(self.subfields):
-            subfield = (self.subfields[self.__pos], self.subfields[self.__pos + 1])
-            self.__pos += 2
-            return subfield
-        raise StopIteration
-
     def __repr__(self):
         if self.is_control_field() or self.tag in ALEPH_CONTROL_FIELDS:
             return '={}  {}'.format(self.tag, self.data.replace(' ', '#'))
         text = '={}  '.format(self.tag)
-        for indicator in self.indicators:
+        for indicator in self._indicators:
             if indicator in (' ', '#'):
                 text += '#'
             else:
@@ -486,17 +1104,71 @@ class Field(object):
             return True
         if self.tag in ALEPH_CONTROL_FIELDS:
             return True
-        if hasattr(self, 'data'):
+        if hasattr(self, '_data'):
             return True
         return False
 
     def as_marc(self):
+        if self.raw is not None:
+            return bytes(self.raw) + END_OF_FIELD_BYTES
         if self.is_control_field():
             return (self.data + END_OF_FIELD).encode('utf-8')
-        marc = self.indicator1 + self.indicator2
-        for subfield in self:
-            marc += SUBFIELD_INDICATOR + subfield[0] + subfield[1]
-        return (marc + END_OF_FIELD).encode('utf-8')
+        marc = [self.indicator1, self.indicator2]
+        for code, value in zip(self._subfields[0::2], self._subfields[1::2]):
+            marc.extend((SUBFIELD_INDICATOR, code, value))
+        marc.append(END_OF_FIELD)
+        return ''.join(marc).encode('utf-8')
+
+
+def decode_field(tag: str, data) -> 'Field':
+    """Function to create a Field from the bytes (or memoryview) of a single field,
+    excluding the END_OF_FIELD byte"""
+    # Check if tag is a control field
+    if (tag < '010' and tag.isdigit()) or tag in ALEPH_CONTROL_FIELDS:
+        return Field(tag=tag, data=str(data, 'utf-8'), raw=data)
+    try:
+        # A SUBFIELD_INDICATOR byte cannot occur within a multi-byte UTF-8 sequence,
+        # so decoding the whole field and splitting the text is equivalent to splitting the bytes
+        text = str(data, 'utf-8')
+    except UnicodeDecodeError:
+        return _decode_field_by_subfield(tag, bytes(data))
+    if SUBFIELD_INDICATOR not in text:
+        return Field(tag=tag, data=text, raw=data)
+    subfields = list()
+    subs = text.split(SUBFIELD_INDICATOR)
+    # Missing indicators are recorded as blank spaces.
+    # Extra indicators are ignored.
+    subs[0] = subs[0] + '  ' if subs[0].isascii() else '   '
+    for subfield in subs[1:]:
+        if len(subfield) == 0 or not subfield[0].isascii():
+            continue
+        subfields.append(subfield[0])
+        subfields.append(subfield[1:])
+    return Field(tag=tag, indicators=[subs[0][0], subs[0][1]], subfields=subfields, raw=data)
+
+
+def _decode_field_by_subfield(tag: str, data: bytes) -> 'Field':
+    """Function to create a Field from bytes which are not valid UTF-8 as a whole.
+    Subfields which cannot be decoded are skipped"""
+    if SUBFIELD_INDICATOR_BYTES not in data:
+        return Field(tag=tag, data=data.decode('utf-8'))
+    subfields = list()
+    subs = data.split(SUBFIELD_INDICATOR_BYTES)
+    try:
+        subs[0] = subs[0].decode('ascii') + '  '
+    except Exception:
+        subs[0] = '   '
+    for subfield in subs[1:]:
+        if len(subfield) == 0:
+            continue
+        try:
+            code, value = subfield[0:1].decode('ascii'), subfield[1:].decode('utf-8', 'strict')
+        except Exception:
+            pass
+        else:
+            subfields.append(code)
+            subfields.append(value)
+    return Field(tag=tag, indicators=[subs[0][0], subs[0][1]], subfields=subfields, raw=data)
 
 
 def map_records(f: Callable, *files: BytesIO) -> None:
@@ -505,6 +1177,189 @@ def map_records(f: Callable, *files: BytesIO) -> None:
         list(map(f, MARCReader(file)))
 
 
+def map_records_parallel(f: Callable, *files: str, workers: int = None, ordered: bool = True,
+                         chunk_size: int = CHUNK_SIZE, lazy: bool = False):
+    """Generator which applies a given function to each record in a batch, using a pool of processes.
+
+    Each file is divided into chunks of about chunk_size bytes, beginning and ending at record boundaries,
+    and each chunk is read and processed by a separate process.
+    The function and its results must be picklable, so the function should be defined at module level.
+    If ordered is True, results are yielded in the order of the records within the files;
+    otherwise they are yielded as soon as each chunk is complete.
+    At most two chunks per process are in progress at any time, so memory use is bounded"""
+    workers = workers or os.cpu_count() or 1
+    chunks = ((file, start, end) for file in files
+              for start, end in split_file(file, -(-os.path.getsize(file) // chunk_size)))
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        if ordered:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_map_chunk, f, *chunk, lazy))
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        else:
+            pending = set()
+            for chunk in chunks:
+                pending.add(executor.submit(_map_chunk, f, *chunk, lazy))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+            for future in wait(pending).done:
+                yield from future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _map_chunk(f: Callable, path_to_file: str, start: int, end: int, lazy: bool) -> list:
+    """Function to apply a given function to each record beginning between offsets start and end of a file"""
+    reader = MARCReader(path_to_file, lazy=lazy)
+    reader.silent = True
+    reader.file_handle.seek(start)
+    results = []
+    while reader.file_handle.tell() < end:
+        try:
+            results.append(f(next(reader)))
+        except StopIteration:
+            break
+    reader.close()
+    return results
+
+
+def check_records_parallel(*files: str, workers: int = None, chunk_size: int = CHUNK_SIZE):
+    """Generator which checks the structure of the records in a batch of files, using a pool of processes.
+
+    Each file is divided into chunks of about chunk_size bytes, which are checked by separate processes.
+    Results are yielded in the order of the records within the files, as tuples (file, status, error, data)
+    as returned by MARCReaderTentative.read_tentative.
+    Since a record with an incorrect length can extend past the end of its chunk,
+    the position at which each chunk ends is compared with the start of the next chunk;
+    if they differ, the next chunk is checked again from the correct position"""
+    workers = workers or os.cpu_count() or 1
+    metrics = Metrics.active
+    chunks = ((file, start, end) for file in files
+              for start, end in split_file(file, -(-os.path.getsize(file) // chunk_size)))
+    executor = ProcessPoolExecutor(max_workers=workers)
+    current_file, position = None, 0
+    try:
+        pending = deque()
+        chunk = next(chunks, None)
+        while chunk is not None or pending:
+            # At most two chunks per process are in progress at any time, so memory use is bounded
+            while chunk is not None and len(pending) < 2 * workers:
+                pending.append((chunk, executor.submit(_check_chunk, *chunk)))
+                chunk = next(chunks, None)
+            (file, start, end), future = pending.popleft()
+            if file != current_file:
+                current_file, position = file, 0
+                if metrics is not None:
+                    metrics.start_file(file)
+            results, stop, seconds = future.result()
+            if start != position:
+                logging.debug(f'Checking {file} again from offset {str(position)}')
+                results, stop, seconds = _check_chunk(file, position, end) if position < end else ([], position, 0)
+            position = stop
+            if metrics is not None:
+                metrics.add('read', seconds, records=len(results), size=sum(len(r[2]) for r in results))
+                metrics.count_error(sum(not r[0] for r in results))
+            for status, error, data in results:
+                yield file, status, error, data
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if metrics is not None:
+            metrics.end_file()
+
+
+def _check_chunk(path_to_file: str, start: int, end: int) -> tuple:
+    """Function to check the records beginning between offsets start and end of a file.
+    Returns the results, the offset at which the following record begins, and the time taken"""
+    started = time.perf_counter()
+    reader = MARCReaderTentative(path_to_file, metrics=False)
+    reader.silent = True
+    reader.file_handle.seek(start)
+    results = []
+    while reader.tell() < end:
+        try:
+            results.append(reader.read_tentative())
+        except StopIteration:
+            break
+    stop = reader.tell()
+    reader.close()
+    return results, stop, time.perf_counter() - started
+
+
+def find_end_of_record(file_handle, position: int):
+    """Function to find the first END_OF_RECORD byte at or after a given position in a file,
+    reading the file in blocks. Returns the offset of the byte, or None if there is none"""
+    file_handle.seek(position)
+    while True:
+        block = file_handle.read(BLOCK_SIZE)
+        if not block:
+            return None
+        i = block.find(END_OF_RECORD_BYTES)
+        if i >= 0:
+            return position + i
+        position += len(block)
+
+
+def read_record_blocks(file_handle, block_size: int = CHUNK_SIZE):
+    """Generator to read a file of MARC records in blocks of about block_size bytes which end at record boundaries,
+    using only the record length in the first 5 bytes of each record.
+    Yields (block, offsets) tuples, where block is a memoryview and offsets are the offsets of the records
+    within the block, followed by the length of the block"""
+    rest = b''
+    while True:
+        data = file_handle.read(block_size)
+        block = rest + data if rest else data
+        if not block:
+            return
+        offsets, position = [], 0
+        while position + 5 <= len(block):
+            first5 = block[position:position + 5]
+            if not first5.isdigit() or int(first5) <= LEADER_LENGTH:
+                raise RecordLengthError
+            if position + int(first5) > len(block):
+                break
+            offsets.append(position)
+            position += int(first5)
+        if not data and position < len(block):
+            # The file ends part of the way through a record
+            raise RecordLengthError
+        rest = block[position:]
+        if offsets:
+            offsets.append(position)
+            yield memoryview(block)[:position], offsets
+
+
+def split_file(path_to_file: str, chunks: int) -> list:
+    """Function to divide a file of MARC records into byte ranges which begin and end at record boundaries.
+    Boundaries are found by searching forward from evenly spaced positions for an END_OF_RECORD byte
+    followed by a valid record length.
+    Returns a list of (start, end) tuples; there may be fewer than requested if the records are large"""
+    size = os.path.getsize(path_to_file)
+    boundaries = [0]
+    with open(path_to_file, mode='rb') as file_handle:
+        for i in range(1, chunks):
+            position = max(size * i // chunks, boundaries[-1] + 1)
+            while position < size:
+                end_of_record = find_end_of_record(file_handle, position - 1)
+                if end_of_record is None:
+                    position = size
+                    break
+                position = end_of_record + 1
+                file_handle.seek(position)
+                if file_handle.read(5).isdigit():
+                    break
+            if position >= size:
+                break
+            boundaries.append(position)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries[:-1], boundaries[1:]) if end > start]
+
+
 def is_control_field_tag(tag: str) -> bool:
     """Function to test whether a tag denotes a control field"""
     if not tag:
@@ -513,4 +1368,67 @@ def is_control_field_tag(tag: str) -> bool:
         return True
     if tag in ALEPH_CONTROL_FIELDS:
         return True
-    return False
\ No newline at end of file
+    return False
+
+
+def is_deleted(marc) -> bool:
+    """Function to test whether the raw data of a record has record status d (deleted) in the leader"""
+    return marc[5:6] == b'd'
+
+
+def merge_replace(marc, update):
+    """Function to merge two versions of a record by replacing the earlier version with the update"""
+    return update
+
+
+def merge_newer(marc, update):
+    """Function to merge two versions of a record by keeping the version with the later date and time
+    of latest transaction in field 005. The update is kept unless the earlier version is later"""
+    if (get_control_field(marc, '005') or '') > (get_control_field(update, '005') or ''):
+        return marc
+    return update
+
+
+def merge_union(marc, update) -> bytes:
+    """Function to merge two versions of a record field by field.
+    The leader, control fields and non-repeatable data fields (see NON_REPEATABLE_TAGS) are taken from the update
+    where present; other data fields in the update which are not in the earlier version are added
+    after the fields with the same tag"""
+    record, update_record = Record(marc), Record(update)
+    replaced_tags = {field.tag for field in update_record.fields
+                     if field.is_control_field() or field.tag in NON_REPEATABLE_TAGS}
+    fields = [field for field in record.fields if field.tag not in replaced_tags]
+    existing = {(field.tag, field.as_marc()) for field in fields}
+    for field in update_record.fields:
+        if field.tag not in replaced_tags and (field.tag, field.as_marc()) in existing:
+            continue
+        # Insert the field after the last field with the same or an earlier tag, so that the order is kept
+        i = len(fields)
+        while i > 0 and fields[i - 1].tag > field.tag:
+            i -= 1
+        fields.insert(i, field)
+    merged = Record(leader=update_record.leader)
+    merged.add_field(*fields)
+    return merged.as_marc()
+
+
+def merge_versions(marc, versions: list, merge: Callable):
+    """Function to merge the versions of a record from an update file into the raw data of a record, in order.
+    marc is None if the record is new. Versions with record status d delete the record.
+    Returns the raw data of the merged record, or None if the record is deleted"""
+    for update in versions:
+        if is_deleted(update):
+            marc = None
+        elif marc is None:
+            marc = update
+        else:
+            marc = merge(marc, update)
+    return marc
+
+
+# Functions to merge two versions of a record, given their raw data
+MERGE_POLICIES = OrderedDict([
+    ('replace', merge_replace),
+    ('newer', merge_newer),
+    ('union', merge_union),
+])
\ No newline at end of file
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# ====================
+#       Set-up
+# ====================
+
+
+# Import required modules
+from catbridge_tools.rule_tools import *
+
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+# ====================
+#       Classes
+# ====================
+
+
+class Stage(object):
+    """A stage of a pipeline, which applies the logic of one of the utilities to each record in turn.
+
+    process is called with each record, and returns the record to pass to the next stage.
+    output_path gives the name of the file of MARC records the utility would write for a given input file,
+    or None if the utility does not write MARC records"""
+
+    name = None
+
+    def __repr__(self):
+        return self.name
+
+    def output_path(self, path_to_file: str):
+        return None
+
+    def process(self, record):
+        return record
+
+    def close(self):
+        pass
+
+
+class CheckStage(Stage):
+    """Stage which checks the structural validity of records, as marc_check.
+
+    Since records must be checked before they are decoded, this can only be the first stage of a pipeline.
+    Flawed records are written to a file with the suffix _f, and are not passed to later stages"""
+
+    name = 'check'
+
+    def output_path(self, path_to_file: str):
+        return output_path(path_to_file, suffix='_ok')
+
+    @staticmethod
+    def records(reader, path_to_file: str):
+        """Generator to read and check the records in a file, yielding those which are valid"""
+        errors = 0
+        efile = open_file(output_path(path_to_file, suffix='_f', extension='.lex', default='stdin_f.lex'), mode='wb')
+        while True:
+            try:
+                status, error, data = reader.next_tentative()
+            except StopIteration:
+                break
+            if status:
+                yield LazyRecord(data)
+            else:
+                errors += 1
+                log_print(f'Error at record {str(reader.count)}: {error}')
+                efile.write(data)
+        efile.close()
+        log_print(f'File {os.path.basename(file_name(path_to_file))} contains {str(errors)} flawed records')
+
+
+class FixFormatStage(Stage):
+    """Stage which converts FMT control fields into data fields, as fix_fmt"""
+
+    name = 'fix_fmt'
+
+    def output_path(self, path_to_file: str):
+        return output_path(path_to_file, prefix='fix-')
+
+    def process(self, record):
+        return fix_fmt(record)
+
+
+class KeepFieldStage(Stage):
+    """Stage which keeps (or, if delete is True, deletes) the fields and subfields specified in a config file,
+    as keep_fld"""
+
+    name = 'keep_fld'
+
+    def __init__(self, path_to_config: str, delete: bool = False):
+        self.rules = KeepFieldRules(path_to_config)
+        self.delete = delete
+
+    def output_path(self, path_to_file: str):
+        return output_path(path_to_file, prefix=f'{"d" if self.delete else "k"}-')
+
+    def process(self, record):
+        return self.rules.apply(record, delete=self.delete)
+
+
+class ControlNumberStage(Stage):
+    """Stage which writes the control numbers specified in a config file to a text file, as cn_find.
+    Records are passed to the next stage unchanged"""
+
+    name = 'cn_find'
+
+    def __init__(self, path_to_config: str, path_to_output: str, convert: bool = False, rid: bool = False,
+                 tidy: bool = False, memory_limit: int = MEMORY_LIMIT):
+        self.rules = ControlNumberRules(path_to_config)
+        self.writer = ControlNumberWriter(path_to_output, self.rules, convert=convert, rid=rid, tidy=tidy,
+                                          memory_limit=memory_limit)
+
+    def process(self, record):
+        self.writer.write(record)
+        return record
+
+    def close(self):
+        self.writer.close()
+
+
+class Pipeline(object):
+    """Stages applied in turn to each record of a file.
+
+    Each file is read and decoded once, and the records output by the last stage are encoded and written once,
+    to the file which would be written by running the utilities one after another.
+    E.g. for stages check, fix_fmt and keep_fld, records from file.lex are written to k-fix-file_ok.lex"""
+
+    def __init__(self, stages: list):
+        for stage in stages[1:]:
+            if isinstance(stage, CheckStage):
+                raise CBError(f'Error: stage {stage.name} must be the first stage of the pipeline')
+        self.stages = stages
+
+    def __repr__(self):
+        return ' > '.join(repr(stage) for stage in self.stages)
+
+    def output_path(self, path_to_file: str):
+        """Function to get the name of the file to which records are written, or None if no records are written"""
+        output = None
+        for stage in self.stages:
+            output = stage.output_path(output or path_to_file) or output
+        return output
+
+    def run(self, path_to_file: str):
+        """Function to read a file and pass each record through the stages"""
+        if self.stages and isinstance(self.stages[0], CheckStage):
+            reader = MARCReaderTentative(path_to_file)
+            records = self.stages[0].records(reader, path_to_file)
+        else:
+            reader = MARCReader(path_to_file, lazy=True)
+            records = reader
+        output = self.output_path(path_to_file)
+        writer = MARCWriter(output) if output is not None else None
+        for record in records:
+            for stage in self.stages:
+                record = stage.process(record)
+            if writer is not None:
+                writer.write(record)
+        if writer is not None:
+            writer.close()
+        reader.close()
+
+    def close(self):
+        for stage in self.stages:
+            stage.close()
@@ -0,0 +1,430 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# ====================
+#       Set-up
+# ====================
+
+
+# Import required modules
+from catbridge_tools.marc_tools import *
+
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+# ====================
+#  Regular expressions
+# ====================
+
+
+RE_CN_FIND_CONFIG = re.compile(r'^=(?P<tag>[0-9A-Z]{3})  (?P<ind>[0-9*#][0-9*#])\$(?P<sf>[a-z0-9*])\s*\t(?P<content>.*?)\s*$|'
+                               r'^=(?P<control_tag>00[0-9]|[A-Z]{3})\s*\t(?P<data>.*?)\s*$')
+RE_KEEP_FLD_CONFIG = re.compile(r'^=(?P<tag>[0-9A-Z]{3})  (?P<ind>[0-9*#][0-9*#])(?P<sfs>(?:\$[a-z0-9*] ?.*?)*)$|'
+                                r'^=(?P<control_tag>00[0-9]|[A-Z]{3})(  )?(?P<data>.*?)$')
+MATCH_ALL = '.*'
+
+RE_CONTROL_NUMBERS = {
+    'ISBN': re.compile(r'\b(?=(?:[0-9]+[\- ]?){10})[0-9]{9}[0-9Xx]\b|'
+                       r'\b(?=(?:[0-9]+[\- ]?){13})[0-9]{1,5}[\- ][0-9]+[\- ][0-9]+[\- ][0-9Xx]\b|'
+                       r'\b97[89][0-9]{10}\b|'
+                       r'\b(?=(?:[0-9]+[\- ]){4})97[89][\- 0-9]{13}[0-9]\b'),
+    'ISBN10': re.compile(r'\b(?=(?:[0-9]+[\- ]?){10})[0-9]{9}[0-9Xx]\b|'
+                         r'\b(?=(?:[0-9]+[\- ]?){13})[0-9]{1,5}[\- ][0-9]+[\- ][0-9]+[\- ][0-9Xx]\b'),
+    'ISBN13': re.compile(r'\b97[89][0-9]{10}\b|'
+                         r'\b(?=(?:[0-9]+[\- ]){4})97[89][\- 0-9]{13}[0-9]\b'),
+    'ISSN': re.compile(r'\b[0-9]{4}[ \-]?[0-9]{3}[0-9Xx]\b'),
+    'LCCN': re.compile(r'\b[a-z][a-z ][a-z ]?[0-9]{2}[0-9]{6} ?\b'),
+    'ISNI': re.compile(r'\b[0]{4}[ \-]?[0-9]{4}[ \-]?[0-9]{4}[ \-]?[0-9]{3}[0-9Xx]\b'),
+    'BL001': re.compile(r'\b[0-9]{9}\b'),
+    'FAST': re.compile(r'\bfst[0-9]{8}\b'),
+    'OCLC': re.compile(r'\(OCoLC\)[0-9]+\b'),
+    'BNB':  re.compile(r'\bGB([0-9]{7}|[A-Z][0-9][A-Z0-9][0-9]{4})\b')
+}
+RE_ISBN_WORD = re.compile(r'[0-9][0-9Xx\-]{9,16}')
+RE_SORT_KEY = re.compile(r'^(?P<tag>[0-9A-Z]{3})(?:\$(?P<code>[a-z0-9]))?$')
+
+
+# ====================
+#      Functions
+# ====================
+
+
+def clean_isbn(s):
+    return re.sub(r'[^0-9X]', '', s.upper())
+
+
+def clean_issn(s):
+    s = re.sub(r'[^0-9X]', '', s.upper())
+    return f'{s[:4]}-{s[4:]}'
+
+
+CONTROL_NUMBER_CLEANING = {
+    'ISBN': clean_isbn,
+    'ISBN10': clean_isbn,
+    'ISBN13': clean_isbn,
+    'ISSN': clean_issn,
+    'ISNI': clean_isbn,
+}
+
+
+def record_isbn(record):
+    """Function to get the first valid ISBN in subfield $a of field 020 of a record, in 13-digit form.
+    ISBNs are looked for in words of digits, which may contain hyphens; this is much faster than the ISBN pattern
+    in RE_CONTROL_NUMBERS, but does not find ISBNs in which groups of digits are separated by spaces.
+    Returns None if there is no valid ISBN"""
+    for field in record.get_fields('020'):
+        for subfield in field.get_subfields('a'):
+            for isbn in RE_ISBN_WORD.findall(subfield):
+                isbn = clean_isbn(isbn)
+                if is_isbn_10(isbn):
+                    return isbn_convert(isbn)
+                if is_isbn_13(isbn):
+                    return isbn
+    return None
+
+
+def record_control_number(record):
+    """Function to get the record ID from field 001 of a record, or None if there is none"""
+    field = record['001']
+    if field is None or not field.is_control_field() or not field.data.strip():
+        return None
+    return field.data.strip()
+
+
+def record_hash(record):
+    """Function to get a hash of the complete content of a record"""
+    return hashlib.blake2b(record.as_marc(), digest_size=16).hexdigest()
+
+
+# Functions to get the key by which duplicate records are identified, or None if a record has no key
+DEDUPLICATION_KEYS = OrderedDict([
+    ('001', record_control_number),
+    ('isbn', record_isbn),
+    ('hash', record_hash),
+])
+
+
+# ====================
+#       Classes
+# ====================
+
+
+class FieldRule(object):
+    """Rule from a keep_fld config file for a single field tag, with its regular expressions compiled.
+
+    For control fields, pattern is the compiled regular expression for the field contents,
+    or None if any contents match.
+    For data fields, indicators holds each indicator with # replaced by a blank space, or None for *,
+    and subfields maps each subfield code (or *) to a list of compiled regular expressions,
+    or None if any contents match"""
+
+    def __init__(self, tag, line, indicators=None, subfields=None, pattern=None):
+        self.tag = tag
+        self.line = line
+        self.pattern = pattern
+        self.indicators = [None if i == '*' else i.replace('#', ' ') for i in indicators or '**']
+        self.subfields = subfields or {'*': None}
+
+    def __repr__(self):
+        return self.line
+
+    def match_indicators(self, field) -> bool:
+        for rule_indicator, indicator in zip(self.indicators, field.normalized_indicators):
+            if rule_indicator is not None and indicator not in ('*', rule_indicator):
+                return False
+        return True
+
+    def match_subfield(self, code: str, content: str) -> bool:
+        for c in (code, '*'):
+            if c in self.subfields:
+                patterns = self.subfields[c]
+                if patterns is None or any(p.search(content) for p in patterns):
+                    return True
+        return False
+
+
+class KeepFieldRules(object):
+    """Rules read from a keep_fld config file, compiled into a dictionary keyed by field tag"""
+
+    def __init__(self, path_to_config):
+        self.rules = {}
+        r = str(RE_KEEP_FLD_CONFIG.pattern).replace('\\\\', '\\')
+        cfile = open(path_to_config, mode='r', encoding='utf-8', errors='replace')
+        for lineno, line in enumerate(cfile):
+            line = line.strip()
+            if line.startswith('001'):
+                continue
+            m = RE_KEEP_FLD_CONFIG.match(line)
+            if not m:
+                raise CBError(f'Error at line {str(lineno + 1)} of config file: '
+                              f'line {line} does not match pattern {r}')
+            tag = m.group('control_tag') or m.group('tag')
+            if tag in self.rules:
+                raise CBError(f'Error at line {str(lineno + 1)} of config file: '
+                              f'field tag {tag} already specified')
+            if m.group('control_tag'):
+                if not is_control_field_tag(tag):
+                    raise CBError(f'Error at line {str(lineno + 1)} of config file: '
+                                  f'control field contents specified for data field {tag}')
+                pattern = None
+                if m.group('data') and m.group('data') not in ('*', MATCH_ALL):
+                    pattern = self.compile(m.group('data'), lineno)
+                self.rules[tag] = FieldRule(tag, line, pattern=pattern)
+                continue
+            if is_control_field_tag(tag):
+                raise CBError(f'Error at line {str(lineno + 1)} of config file: '
+                              f'data field contents specified for control field {tag}')
+            subfields = {}
+            if m.group('sfs') and len(m.group('sfs').strip()) > 0:
+                for subfield in re.split(r'\$(?=[a-z0-9*])', m.group('sfs').strip()):
+                    subfield = subfield.strip()
+                    if len(subfield) < 1:
+                        continue
+                    code, pattern = subfield[0], subfield[1:] or MATCH_ALL
+                    if pattern == MATCH_ALL:
+                        subfields[code] = None
+                    elif code not in subfields or subfields[code] is not None:
+                        subfields.setdefault(code, []).append(self.compile(pattern, lineno))
+            self.rules[tag] = FieldRule(tag, line, indicators=m.group('ind'), subfields=subfields)
+        cfile.close()
+
+    def __repr__(self):
+        return '\n'.join(repr(rule) for rule in self.rules.values())
+
+    @staticmethod
+    def compile(pattern: str, lineno: int):
+        try:
+            return re.compile(pattern)
+        except re.error as err:
+            raise CBError(f'Error at line {str(lineno + 1)} of config file: '
+                          f'{pattern} is not a valid regular expression: {err}')
+
+    def apply(self, record, delete: bool = False):
+        """Function to keep (or, if delete is True, delete) the fields and subfields matching the rules.
+        Field 001 is always kept. Returns the record itself if no fields are removed or changed"""
+        output_record = Record(leader=record.leader)
+        for field in record:
+            tag = field.tag
+            rule = self.rules.get(tag)
+
+            # Always include 001 in output
+            if tag == '001':
+                output_record.add_field(field)
+                continue
+
+            # Simple case
+            if rule is None:
+                if delete:
+                    output_record.add_field(field)
+                continue
+
+            # Control fields
+            if field.is_control_field():
+                if (rule.pattern is None or rule.pattern.search(field.data) is not None) ^ delete:
+                    output_record.add_field(field)
+                continue
+
+            if not rule.match_indicators(field):
+                if delete:
+                    output_record.add_field(field)
+                continue
+
+            # Consider subfields individually
+            subfields = list(field)
+            output_subfields = []
+            for code, content in subfields:
+                if rule.match_subfield(code, content) ^ delete:
+                    output_subfields.extend((code, content))
+            if len(output_subfields) == 2 * len(subfields) and output_subfields:
+                output_record.add_field(field)
+            elif output_subfields:
+                output_record.add_field(Field(tag=tag, indicators=[field.indicator1, field.indicator2],
+                                              subfields=output_subfields))
+
+        # Records in which every field has been kept are returned unchanged
+        if output_record.get_fields() == record.get_fields():
+            return record
+        return output_record
+
+
+class ControlNumberRule(FieldRule):
+    """Rule from a cn_find config file, with its regular expression compiled.
+
+    subfield is the subfield code to search, or None to search all subfields;
+    clean is the function used to normalise matches, or None"""
+
+    def __init__(self, tag, line, indicators=None, subfield=None, pattern=None, clean=None):
+        super().__init__(tag, line, indicators=indicators, pattern=pattern)
+        self.subfield = subfield
+        self.clean = clean
+
+    def find(self, content: str):
+        for m in self.pattern.finditer(content):
+            yield self.clean(m.group(0)) if self.clean else m.group(0).strip()
+
+
+class ControlNumberRules(object):
+    """Rules read from a cn_find config file, compiled into a dictionary keyed by field tag.
+
+    The rules for each tag are grouped by subfield code,
+    so that each field of a record is visited once and each subfield is extracted once for all of its rules.
+    path_to_config may also be a file object, such as a StringIO, which is not closed"""
+
+    def __init__(self, path_to_config):
+        self.rules = []
+        r = str(RE_CN_FIND_CONFIG.pattern).replace('\\\\', '\\')
+        if isinstance(path_to_config, str):
+            cfile = open(path_to_config, mode='r', encoding='utf-8', errors='replace')
+        else:
+            cfile = path_to_config
+        for lineno, line in enumerate(cfile):
+            line = line.strip()
+            m = RE_CN_FIND_CONFIG.match(line)
+            if not m:
+                raise CBError(f'Error at line {str(lineno + 1)} of config file: '
+                              f'line {line} does not match pattern {r}')
+            if m.group('control_tag'):
+                tag, pattern, indicators, subfield = m.group('control_tag'), m.group('data'), None, None
+            else:
+                tag, pattern, indicators, subfield = m.group('tag'), m.group('content'), m.group('ind'), m.group('sf')
+            if pattern in RE_CONTROL_NUMBERS:
+                regex = RE_CONTROL_NUMBERS[pattern]
+            else:
+                logging.debug(f'Compiling regex {pattern}')
+                regex = KeepFieldRules.compile(pattern, lineno)
+            self.rules.append(ControlNumberRule(tag, line, indicators=indicators,
+                                                subfield=None if subfield == '*' else subfield,
+                                                pattern=regex, clean=CONTROL_NUMBER_CLEANING.get(pattern)))
+        if cfile is not path_to_config:
+            cfile.close()
+
+        # tag -> subfield code -> list of (position of rule in config file, rule)
+        self.tags = {}
+        for i, rule in enumerate(self.rules):
+            self.tags.setdefault(rule.tag, {}).setdefault(rule.subfield, []).append((i, rule))
+
+    def __repr__(self):
+        return '\n'.join(repr(rule) for rule in self.rules)
+
+    def find(self, record, convert: bool = False):
+        """Generator to find the control numbers in a record matching the rules.
+        Control numbers are yielded in the order of the rules in the config file,
+        and then in the order in which they occur in the record.
+        If convert is True, valid 10-digit ISBNs are converted to 13-digit form"""
+        # With no rules, get_fields would return every field
+        if not self.tags:
+            return
+        found = {}
+        for field in record.get_fields(*self.tags):
+            for code, rules in self.tags[field.tag].items():
+                rules = [(i, rule) for i, rule in rules if field.is_control_field() or rule.match_indicators(field)]
+                if not rules:
+                    continue
+                subfields = field.get_subfields(code) if code else field.get_subfields()
+                for i, rule in rules:
+                    for subfield in subfields:
+                        found.setdefault(i, []).extend(rule.find(subfield))
+        for i in sorted(found):
+            for t in found[i]:
+                if convert and is_isbn_10(t):
+                    t = isbn_convert(t)
+                yield t
+
+    def find_text(self, text: str, convert: bool = False) -> list:
+        """Function to find the control numbers in a line of text matching the pattern of any of the rules,
+        normalised as they would be if they were found in a record.
+        Returns a list of unique control numbers, in the order of the rules in the config file"""
+        found = []
+        for rule in self.rules:
+            for t in rule.find(text):
+                if convert and is_isbn_10(t):
+                    t = isbn_convert(t)
+                if t not in found:
+                    found.append(t)
+        return found
+
+
+class ControlNumberWriter(object):
+    """Writes the control numbers found in records by a set of ControlNumberRules to a text file.
+
+    If tidy is True, the control numbers are sorted and de-duplicated when the writer is closed,
+    using at most memory_limit bytes of memory, and duplicates are also written to a file with the prefix dp-.
+    Otherwise, if rid is True, the record ID is included as the first column"""
+
+    def __init__(self, path_to_file, rules: ControlNumberRules, convert: bool = False, rid: bool = False,
+                 tidy: bool = False, memory_limit: int = MEMORY_LIMIT):
+        if rid and tidy:
+            raise CBError(f'Error: options rid and tidy cannot be used at the same time')
+        self.path_to_file = path_to_file
+        self.rules = rules
+        self.convert, self.rid, self.tidy = convert, rid, tidy
+        self.cn = ExternalDeduplicator(memory_limit) if tidy else None
+        self.file_handle = open_file(path_to_file, mode='w', encoding='utf-8', errors='replace')
+
+    def write(self, record):
+        for t in self.rules.find(record, convert=self.convert):
+            if self.tidy:
+                self.cn.add(t)
+            else:
+                if self.rid:
+                    t = f'{record.id()}\t{t}'
+                self.file_handle.write(f'{t}\n')
+
+    def close(self):
+        if self.file_handle is None:
+            return
+        if self.tidy:
+            # Unique and duplicate control numbers are written in a single pass through the sorted list
+            dfile = open_file(output_path(self.path_to_file, prefix='dp-', default='dp-stdout.txt'), mode='w',
+                              encoding='utf-8', errors='replace')
+            for t, duplicate in self.cn.sorted():
+                self.file_handle.write(f'{t}\n')
+                if duplicate:
+                    dfile.write(f'{t}\n')
+            dfile.close()
+            self.cn.close()
+        self.file_handle.close()
+        self.file_handle = None
+
+
+class SortKey(object):
+    """Key by which records are sorted, given as isbn, or a field tag optionally followed by $ and a subfield code.
+
+    The key of a record is the first valid ISBN (see record_isbn), the contents of the first control field
+    with the tag, or the first subfield with the code in the data fields with the tag
+    (all of the subfields of the first field, separated by spaces, if no code is given).
+    Records without the field or subfield have the empty string as their key, so that they are sorted first.
+    Only the directory and the field containing the key are decoded for records read as LazyRecord"""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        if spec.lower() == 'isbn':
+            self.tag, self.code = None, None
+            return
+        m = RE_SORT_KEY.match(spec)
+        if not m:
+            raise CBError(f'Error: sort key {spec} must be isbn, or a field tag optionally followed by '
+                          f'$ and a subfield code, e.g. 001 or 245$a')
+        self.tag, self.code = m.group('tag'), m.group('code')
+
+    def __repr__(self):
+        return self.spec
+
+    def __call__(self, record) -> str:
+        if self.tag is None:
+            return record_isbn(record) or ''
+        for field in record.get_fields(self.tag):
+            if field.is_control_field():
+                return field.data.strip()
+            if not self.code:
+                return ' '.join(s.strip() for s in field.get_subfields())
+            subfields = field.get_subfields(self.code)
+            if subfields:
+                return subfields[0].strip()
+        return ''
+
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# ====================
+#       Set-up
+# ====================
+
+
+# Import required modules
+from catbridge_tools.rule_tools import *
+from collections import Counter
+
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+# ====================
+#     Constants
+# ====================
+
+
+# Header of statistics written as TSV; field is a tag or value specification, and key an indicator pair,
+# subfield code, value or number of fields, depending on the statistic
+TSV_HEADER = ['statistic', 'field', 'key', 'count']
+
+
+# ====================
+#       Classes
+# ====================
+
+
+class FieldStatistics(object):
+    """Counts of the fields, indicators, subfields and values in a set of MARC records.
+
+    Fields are counted from the record directory alone, without decoding them.
+    If subfields is True, the indicators and subfield codes of data fields are also counted,
+    by splitting the raw data of each field rather than decoding it;
+    fields which contain no subfields, such as FMT, are treated as control fields, as when they are decoded.
+    values is a list of field tags, each optionally followed by $ and a subfield code, e.g. 008 or 040$a,
+    whose contents are counted; only the fields with these tags are decoded.
+    Statistics for parts of a batch of records can be combined using update,
+    so that they can be collected in parallel"""
+
+    def __init__(self, subfields: bool = False, values: list = None):
+        self.subfields = subfields
+        # (specification, tag, subfield code or None) for each value to be counted
+        self.values = []
+        for spec in values or []:
+            m = RE_SORT_KEY.match(spec)
+            if not m:
+                raise CBError(f'Error: value {spec} must be a field tag optionally followed by '
+                              f'$ and a subfield code, e.g. 008 or 040$a')
+            self.values.append((spec, m.group('tag'), m.group('code')))
+        self.value_tags = {tag for spec, tag, code in self.values}
+        self.records = 0
+        # Occurrences of each tag, number of records containing each tag,
+        # and number of records with each number of fields
+        self.tags, self.record_tags, self.fields_per_record = Counter(), Counter(), Counter()
+        # Occurrences of each (tag, indicators) and (tag, subfield code)
+        self.indicators, self.codes = Counter(), Counter()
+        self.value_counts = OrderedDict((spec, Counter()) for spec, tag, code in self.values)
+
+    def __len__(self):
+        return self.records
+
+    def add(self, marc):
+        """Function to add the statistics for a record, given its raw data"""
+        entries = Record().read_directory(marc)
+        self.records += 1
+        tags = [entry[0] for entry in entries]
+        self.tags.update(tags)
+        self.record_tags.update(set(tags))
+        self.fields_per_record[len(entries)] += 1
+        if not (self.subfields or self.value_tags):
+            return
+        # Indicators and subfield codes are counted as bytes, and decoded when the statistics are output,
+        # and each Counter is updated once for the whole record
+        indicators, codes = [], []
+        for tag, start, end in entries:
+            if self.subfields and not is_control_field_tag(tag):
+                # Fields with non-numeric tags such as FMT are only treated as data fields if they contain subfields,
+                # as when they are decoded
+                data = bytes(marc[start:end])
+                if SUBFIELD_INDICATOR_BYTES in data:
+                    parts = data.split(SUBFIELD_INDICATOR_BYTES)
+                    indicators.append((tag, parts[0][:2]))
+                    codes.extend((tag, part[:1]) for part in parts[1:])
+            if tag in self.value_tags:
+                field = decode_field(tag, marc[start:end])
+                for spec, value_tag, code in self.values:
+                    if value_tag == tag:
+                        self.value_counts[spec].update(self.field_values(field, code))
+        self.indicators.update(indicators)
+        self.codes.update(codes)
+
+    @staticmethod
+    def field_values(field, code: str = None) -> list:
+        """Function to get the values of a field to be counted: the contents of a control field,
+        the subfields with the given code, or all the subfields of a data field, separated by spaces"""
+        if field.is_control_field():
+            return [] if code else [field.data.strip()]
+        if code:
+            return [s.strip() for s in field.get_subfields(code)]
+        return [' '.join(s.strip() for s in field.get_subfields())]
+
+    def update(self, other: 'FieldStatistics'):
+        """Function to add the statistics collected for another set of records"""
+        self.records += other.records
+        for counter in ['tags', 'record_tags', 'fields_per_record', 'indicators', 'codes']:
+            getattr(self, counter).update(getattr(other, counter))
+        for spec, counter in other.value_counts.items():
+            self.value_counts[spec].update(counter)
+
+    @staticmethod
+    def by_tag(counter: Counter) -> OrderedDict:
+        """Function to arrange a Counter keyed by (tag, key) tuples, where each key is bytes,
+        as a dictionary of dictionaries, sorted by tag"""
+        result = OrderedDict()
+        for (tag, key), count in sorted(counter.items()):
+            key = str(key, 'utf-8', 'replace').replace(' ', '#')
+            result.setdefault(tag, OrderedDict())[key] = result.get(tag, {}).get(key, 0) + count
+        return result
+
+    def as_dict(self, top: int = None) -> OrderedDict:
+        """Function to get the statistics as a dictionary, suitable for output as JSON.
+        Only the top most common values for each value specification are included, if top is given"""
+        statistics = OrderedDict([
+            ('records', self.records),
+            ('fields_per_record', OrderedDict((str(n), count) for n, count in sorted(self.fields_per_record.items()))),
+            ('tags', OrderedDict((tag, OrderedDict([('occurrences', count), ('records', self.record_tags[tag])]))
+                                 for tag, count in sorted(self.tags.items()))),
+        ])
+        if self.subfields:
+            statistics['indicators'] = self.by_tag(self.indicators)
+            statistics['subfields'] = self.by_tag(self.codes)
+        if self.values:
+            statistics['values'] = OrderedDict((spec, OrderedDict(counter.most_common(top)))
+                                               for spec, counter in self.value_counts.items())
+        return statistics
+
+    def rows(self, top: int = None):
+        """Generator to get the statistics as rows with the columns in TSV_HEADER"""
+        statistics = self.as_dict(top=top)
+        yield 'records', '', '', statistics['records']
+        for n, count in statistics['fields_per_record'].items():
+            yield 'fields_per_record', '', n, count
+        for tag, counts in statistics['tags'].items():
+            yield 'occurrences', tag, '', counts['occurrences']
+            yield 'records', tag, '', counts['records']
+        for statistic in ['indicators', 'subfields', 'values']:
+            for field, counts in statistics.get(statistic, {}).items():
+                for key, count in counts.items():
+                    yield statistic, field, re.sub(r'[\t\r\n]', ' ', key), count
+
+    def write(self, path_to_file, output_format: str = 'json', top: int = None):
+        """Function to write the statistics to a file as JSON or TSV"""
+        ofile = open_file(path_to_file, mode='w', encoding='utf-8', errors='replace')
+        if output_format == 'tsv':
+            ofile.write('\t'.join(TSV_HEADER) + '\n')
+            for row in self.rows(top=top):
+                ofile.write('\t'.join(str(column) for column in row) + '\n')
+        else:
+            json.dump(self.as_dict(top=top), ofile, ensure_ascii=False, indent=2)
+            ofile.write('\n')
+        ofile.close()
+
+
+# ====================
+#      Functions
+# ====================
+
+
+def file_statistics(path_to_file, subfields: bool = False, values: list = None,
+                    start: int = 0, end: int = None) -> FieldStatistics:
+    """Function to collect statistics for the records beginning between offsets start and end of a file,
+    or from start to the end of the file if end is None"""
+    statistics = FieldStatistics(subfields=subfields, values=values)
+    reader = MARCReader(path_to_file, metrics=False)
+    reader.silent = True
+    if start:
+        reader.file_handle.seek(start)
+    while end is None or reader.file_handle.tell() < end:
+        data = reader.read_marc()
+        if data is None:
+            break
+        statistics.add(data)
+    reader.close()
+    return statistics
+
+
+def statistics_parallel(*files: str, subfields: bool = False, values: list = None, workers: int = None,
+                        chunk_size: int = CHUNK_SIZE) -> FieldStatistics:
+    """Function to collect statistics for the records in a batch of files, using a pool of processes.
+
+    Each file is divided into chunks of about chunk_size bytes, beginning and ending at record boundaries,
+    and the statistics for each chunk are collected by a separate process and then combined"""
+    workers = workers or os.cpu_count() or 1
+    statistics = FieldStatistics(subfields=subfields, values=values)
+    chunks = [(file, start, end) for file in files
+              for start, end in split_file(file, -(-os.path.getsize(file) // chunk_size))]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(file_statistics, file, subfields, values, start, end) for file, start, end in chunks]
+        for future in futures:
+            statistics.update(future.result())
+    return statistics
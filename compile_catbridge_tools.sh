@@ -8,6 +8,24 @@ python -m PyInstaller bin/fix_fmt.py -F
 mv dist/fix_fmt.exe exe/fix_fmt.exe
 python -m PyInstaller bin/marc_check.py -F
 mv dist/marc_check.exe exe/marc_check.exe
+python -m PyInstaller bin/marc_db.py -F
+mv dist/marc_db.exe exe/marc_db.exe
+python -m PyInstaller bin/marc_dedupe.py -F
+mv dist/marc_dedupe.exe exe/marc_dedupe.exe
+python -m PyInstaller bin/marc_sort.py -F
+mv dist/marc_sort.exe exe/marc_sort.exe
+python -m PyInstaller bin/marc_split.py -F
+mv dist/marc_split.exe exe/marc_split.exe
+python -m PyInstaller bin/marc_merge.py -F
+mv dist/marc_merge.exe exe/marc_merge.exe
+python -m PyInstaller bin/cn_index.py -F
+mv dist/cn_index.exe exe/cn_index.exe
+python -m PyInstaller bin/marc_match.py -F
+mv dist/marc_match.exe exe/marc_match.exe
+python -m PyInstaller bin/marc_stats.py -F
+mv dist/marc_stats.exe exe/marc_stats.exe
+python -m PyInstaller bin/pipeline.py -F
+mv dist/pipeline.exe exe/pipeline.exe
 rmdir -rf catbridge_tools/__pycache__
 rm -rf build
 rm *.spec
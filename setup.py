@@ -24,6 +24,15 @@ setup(
         'bin/keep_fld.py',
         'bin/marc_check.py',
         'bin/marc_count.py',
+        'bin/marc_db.py',
+        'bin/marc_dedupe.py',
+        'bin/marc_sort.py',
+        'bin/marc_split.py',
+        'bin/marc_merge.py',
+        'bin/cn_index.py',
+        'bin/marc_match.py',
+        'bin/marc_stats.py',
+        'bin/pipeline.py',
     ],
     zipfile=None,
     options={
@@ -45,6 +54,15 @@ setup(
         'bin/keep_fld.py',
         'bin/marc_check.py',
         'bin/marc_count.py',
+        'bin/marc_db.py',
+        'bin/marc_dedupe.py',
+        'bin/marc_sort.py',
+        'bin/marc_split.py',
+        'bin/marc_merge.py',
+        'bin/cn_index.py',
+        'bin/marc_match.py',
+        'bin/marc_stats.py',
+        'bin/pipeline.py',
     ],
     classifiers=[
         'Development Status :: 4 - Beta',
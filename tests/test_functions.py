@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for catbridge_tools.functions"""
+
+# Import required modules
+import json
+import os
+import random
+import tempfile
+import unittest
+from catbridge_tools.functions import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+class ExternalSorterTestCase(unittest.TestCase):
+
+    def test_sorted(self):
+        # Each run holds only a few pairs, so that several levels of runs are merged
+        rng = random.Random(0)
+        pairs = [(str(rng.randrange(500)), str(i).encode('utf-8')) for i in range(5000)]
+        sorter = ExternalSorter(memory_limit=1000)
+        for key, value in pairs:
+            sorter.add(key, value)
+        self.assertLess(len(sorter.runs), 2 * ExternalSorter.MERGE_RUNS)
+        self.assertIn(2, sorter.levels)
+        # Pairs with equal keys are kept in the order they were added
+        self.assertEqual(list(sorter.sorted()), sorted(pairs, key=lambda pair: pair[0]))
+        sorter.close()
+
+    def test_spilled_runs(self):
+        # The output is the same whether or not the pairs are written to runs
+        rng = random.Random(1)
+        pairs = [(str(rng.randrange(100)), str(i).encode('utf-8')) for i in range(2000)]
+        results = []
+        for memory_limit in [MEMORY_LIMIT, 2000]:
+            sorter = ExternalSorter(memory_limit=memory_limit)
+            for key, value in pairs:
+                sorter.add(key, value)
+            results.append((len(sorter.runs) > 0, list(sorter.sorted())))
+            sorter.close()
+        self.assertEqual([spilled for spilled, result in results], [False, True])
+        self.assertEqual(results[0][1], results[1][1])
+
+    def test_in_memory(self):
+        sorter = ExternalSorter()
+        for key in ['b', 'a', 'c']:
+            sorter.add(key)
+        self.assertEqual(list(sorter.sorted()), [('a', b''), ('b', b''), ('c', b'')])
+        self.assertEqual(sorter.runs, [])
+
+
+class ExternalDeduplicatorTestCase(unittest.TestCase):
+
+    def test_spilled_runs(self):
+        rng = random.Random(2)
+        strings = [str(rng.randrange(1000)) for i in range(3000)]
+        expected = [(s, strings.count(s) > 1) for s in sorted(set(strings))]
+        for memory_limit in [MEMORY_LIMIT, 5000]:
+            deduplicator = ExternalDeduplicator(memory_limit=memory_limit)
+            for s in strings:
+                deduplicator.add(s)
+            self.assertEqual(list(deduplicator.sorted()), expected)
+            deduplicator.close()
+
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path_to_file = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path_to_file)
+
+    def read(self) -> dict:
+        with open(self.path_to_file, encoding='utf-8') as ifile:
+            return json.load(ifile)
+
+    def test_snapshots_do_not_end_file(self):
+        # With an interval of 0, every record triggers a snapshot
+        metrics = Metrics(self.path_to_file, 'test', interval=0.000001)
+        metrics.start_file('input.lex')
+        for i in range(100):
+            metrics.add('read', 0.0, size=10)
+            if i == 49:
+                written = self.read()
+                self.assertEqual(written['files'][0]['records'], 50)
+        self.assertIsNotNone(metrics.file)
+        metrics.finish()
+        written = self.read()
+        self.assertEqual(written['records'], 100)
+        self.assertEqual([f['records'] for f in written['files']], [100])
+        self.assertEqual(len(written['snapshots']), 100)
+
+    def test_files(self):
+        metrics = Metrics(self.path_to_file, 'test')
+        for path in ['a.lex', 'b.lex']:
+            metrics.start_file(path)
+            metrics.add('read', 0.0, records=3)
+        metrics.finish()
+        self.assertEqual([(f['path'], f['records']) for f in self.read()['files']], [('a.lex', 3), ('b.lex', 3)])
+
+if __name__ == '__main__':
+    unittest.main()
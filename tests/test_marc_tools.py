@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for catbridge_tools.marc_tools"""
+
+# Import required modules
+import io
+import os
+import tempfile
+import unittest
+from catbridge_tools.marc_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_data', 'marc_check')
+
+
+def make_record(record_id: str) -> bytes:
+    record = Record(leader='00000nam a2200000 a 4500')
+    record.add_field(Field('001', data=record_id), Field('245', indicators=['1', '0'], subfields=['a', 'Title']))
+    return record.as_marc()
+
+
+def with_length(marc: bytes, length: int) -> bytes:
+    """Function to replace the record length in the first 5 bytes of a record"""
+    return b'%05d' % length + marc[5:]
+
+
+class Stream(io.RawIOBase):
+    """Non-seekable stream of bytes, like standard input"""
+
+    def __init__(self, data: bytes):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self.data.readinto(b)
+
+
+class MARCReaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path_to_file = tempfile.mkstemp(suffix='.lex')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path_to_file)
+
+    def write(self, data: bytes):
+        with open(self.path_to_file, 'wb') as ofile:
+            ofile.write(data)
+
+    def read_ids(self, mmap: bool) -> list:
+        reader = MARCReader(self.path_to_file, mmap=mmap)
+        reader.silent = True
+        try:
+            return [record.id() for record in reader]
+        finally:
+            reader.close()
+
+    def test_read(self):
+        self.write(make_record('1') + make_record('2'))
+        for mmap in [False, True]:
+            self.assertEqual(self.read_ids(mmap), ['1', '2'])
+
+    def test_mmap_invalid_length(self):
+        # A length of 00000 would never advance the position
+        for length in [b'00000', b'00024', b'12a45']:
+            self.write(make_record('1') + length + make_record('2')[5:])
+            with self.assertRaises(RecordLengthError):
+                self.read_ids(True)
+
+    def test_mmap_truncated_record(self):
+        self.write(make_record('1') + make_record('2')[:-10])
+        with self.assertRaises(RecordLengthError):
+            self.read_ids(True)
+
+
+class RecordIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path_to_file = tempfile.mkstemp(suffix='.lex')
+        os.close(handle)
+        self.write([make_record(str(i)) for i in range(3)])
+
+    def tearDown(self):
+        for path in [self.path_to_file, self.path_to_file + INDEX_EXTENSION]:
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def write(self, records: list, mtime: int = None):
+        with open(self.path_to_file, 'wb') as ofile:
+            ofile.write(b''.join(records))
+        if mtime is not None:
+            os.utime(self.path_to_file, ns=(mtime, mtime))
+
+    def get_by_id(self, record_id: str):
+        reader = MARCReader(self.path_to_file)
+        reader.silent = True
+        record = reader.get_by_id(record_id)
+        reader.close()
+        return record and record.id()
+
+    def test_lookup(self):
+        reader = MARCReader(self.path_to_file)
+        reader.silent = True
+        self.assertEqual(reader.get_by_id('1').id(), '1')
+        # Iteration continues from the following record
+        self.assertEqual(next(reader).id(), '2')
+        self.assertEqual(reader.seek_record(0).id(), '0')
+        self.assertIsNone(reader.get_by_id('3'))
+        self.assertEqual(len(reader.get_index()), 3)
+        reader.close()
+        self.assertTrue(os.path.isfile(self.path_to_file + INDEX_EXTENSION))
+
+    def test_size_changed(self):
+        self.assertIsNone(self.get_by_id('3'))
+        self.write([make_record(str(i)) for i in range(4)])
+        self.assertEqual(self.get_by_id('3'), '3')
+
+    def test_modification_time_changed(self):
+        # The file is the same size, so only the modification time shows that the index is out of date
+        mtime = os.stat(self.path_to_file).st_mtime_ns
+        self.assertEqual(self.get_by_id('2'), '2')
+        self.write([make_record(str(i)) for i in [0, 1, 5]], mtime=mtime + 10 ** 9)
+        self.assertIsNone(self.get_by_id('2'))
+        self.assertEqual(self.get_by_id('5'), '5')
+
+
+class RawDataTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # The 245 field has an extra indicator, which is ignored when it is decoded,
+        # so it would be lost if the field were encoded again
+        record = Record(leader='00000nam a2200000 a 4500')
+        record.add_field(Field('001', data='1'), Field('245', indicators=['1', '0x'], subfields=['a', 'Title']))
+        self.data = record.as_marc()
+
+    def test_unmodified(self):
+        record = Record(self.data)
+        self.assertFalse(record.is_modified())
+        self.assertEqual(record.as_marc(), self.data)
+
+    def test_field_changed(self):
+        record = Record(self.data)
+        record['001'].data = '2'
+        self.assertIsNone(record['001'].raw)
+        self.assertTrue(record.is_modified())
+        self.assertEqual(Record(record.as_marc())['001'].data, '2')
+        # Unchanged fields are written as their original bytes
+        self.assertIn(b'\x1e10x\x1faTitle', record.as_marc())
+
+    def test_subfields_changed(self):
+        for change in [lambda field: setattr(field, 'subfields', ['a', 'Other']),
+                       lambda field: setattr(field, 'indicators', ['0', '0'])]:
+            record = Record(self.data)
+            change(record['245'])
+            self.assertIsNone(record['245'].raw)
+            self.assertTrue(record.is_modified())
+            self.assertNotIn(b'\x1e10x\x1faTitle', record.as_marc())
+            self.assertEqual(Record(record.as_marc())['001'].data, '1')
+
+    def test_leader_changed(self):
+        record = Record(self.data)
+        record.leader = record.leader[:5] + 'c' + record.leader[6:]
+        self.assertTrue(record.is_modified())
+        self.assertEqual(record.as_marc()[5:6], b'c')
+
+    def test_fields_added_and_removed(self):
+        record = Record(self.data)
+        record.add_field(Field('500', indicators=[' ', ' '], subfields=['a', 'Note']))
+        self.assertTrue(record.is_modified())
+        self.assertEqual([field.tag for field in Record(record.as_marc()).fields], ['001', '245', '500'])
+        record = Record(self.data)
+        record.remove_field(record['245'])
+        self.assertTrue(record.is_modified())
+        self.assertEqual([field.tag for field in Record(record.as_marc()).fields], ['001'])
+
+
+class MARCReaderTentativeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path_to_file = tempfile.mkstemp(suffix='.lex')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path_to_file)
+
+    def check(self, data: bytes, expected: list):
+        with open(self.path_to_file, 'wb') as ofile:
+            ofile.write(data)
+        for path_to_file in [self.path_to_file, io.BufferedReader(Stream(data))]:
+            reader = MARCReaderTentative(path_to_file)
+            reader.silent = True
+            results = []
+            while True:
+                try:
+                    status, error, marc = reader.read_tentative()
+                except StopIteration:
+                    break
+                results.append((status, marc))
+            reader.close()
+            self.assertEqual(results, expected)
+
+    def test_valid(self):
+        records = [make_record(str(i)) for i in range(3)]
+        self.check(b''.join(records), [(True, marc) for marc in records])
+
+    def test_consecutive_flawed_records(self):
+        # The length of the first record overshoots the second record and part of the third,
+        # and that of the second overshoots part of the third, so the second record is read
+        # from data left over from the first, and some of that data is left over again
+        records = [make_record(str(i)) for i in range(4)]
+        flawed = [with_length(records[0], len(records[0]) + len(records[1]) + 20),
+                  with_length(records[1], len(records[1]) + 10)]
+        self.check(b''.join(flawed + records[2:]),
+                   [(False, flawed[0]), (False, flawed[1]), (True, records[2]), (True, records[3])])
+
+    def test_flawed_record_before_valid_records(self):
+        records = [make_record(str(i)) for i in range(4)]
+        flawed = with_length(records[0], len(records[0]) + len(records[1]) + len(records[2]) - 10)
+        self.check(flawed + b''.join(records[1:]), [(False, flawed)] + [(True, marc) for marc in records[1:]])
+
+class CheckRecordsParallelTestCase(unittest.TestCase):
+
+    @staticmethod
+    def read_sequential(path_to_file: str) -> list:
+        reader = MARCReaderTentative(path_to_file)
+        reader.silent = True
+        results = []
+        while True:
+            try:
+                results.append(reader.read_tentative())
+            except StopIteration:
+                break
+        reader.close()
+        return results
+
+    def test_files(self):
+        # Small chunks end part of the way through flawed records, so some chunks are checked again
+        for name in ['test_clean.lex', 'test_with_errors.lex']:
+            path_to_file = os.path.join(TEST_DATA, name)
+            expected = self.read_sequential(path_to_file)
+            results = [result[1:] for result in check_records_parallel(path_to_file, workers=2, chunk_size=2 ** 16)]
+            self.assertEqual([result[0] for result in results], [result[0] for result in expected])
+            self.assertEqual(b''.join(result[2] for result in results), b''.join(result[2] for result in expected))
+        self.assertIn(False, [result[0] for result in expected])
+
+
+class MergeTestCase(unittest.TestCase):
+
+    @staticmethod
+    def version(status: str, date: str, title: str, *subjects: str) -> bytes:
+        record = Record(leader=f'00000{status}am a2200000 a 4500')
+        record.add_field(Field('001', data='1'), Field('005', data=date),
+                         Field('245', indicators=['1', '0'], subfields=['a', title]),
+                         *[Field('650', indicators=[' ', '0'], subfields=['a', subject]) for subject in subjects])
+        return record.as_marc()
+
+    def setUp(self):
+        self.old = self.version('n', '20200101000000.0', 'Old title', 'History', 'Art')
+        self.new = self.version('c', '20210101000000.0', 'New title', 'Art', 'Music')
+
+    def test_replace(self):
+        self.assertEqual(merge_versions(self.old, [self.new], merge_replace), self.new)
+
+    def test_newer(self):
+        self.assertEqual(merge_versions(self.old, [self.new], merge_newer), self.new)
+        self.assertEqual(merge_versions(self.new, [self.old], merge_newer), self.new)
+
+    def test_union(self):
+        record = Record(merge_versions(self.old, [self.new], merge_union))
+        self.assertEqual(record.leader[5], 'c')
+        self.assertEqual(record['005'].data, '20210101000000.0')
+        # 245 is not repeatable, so it is taken from the update rather than added
+        self.assertEqual([field['a'] for field in record.get_fields('245')], ['New title'])
+        self.assertEqual([field['a'] for field in record.get_fields('650')], ['History', 'Art', 'Music'])
+
+    def test_deletion(self):
+        deleted = self.version('d', '20220101000000.0', 'New title')
+        self.assertTrue(is_deleted(deleted))
+        self.assertFalse(is_deleted(self.new))
+        for merge in MERGE_POLICIES.values():
+            self.assertIsNone(merge_versions(self.old, [self.new, deleted], merge))
+            # A record which is deleted and then added again is new
+            self.assertEqual(merge_versions(self.old, [deleted, self.new], merge), self.new)
+            self.assertIsNone(merge_versions(None, [deleted], merge))
+
+
+if __name__ == '__main__':
+    unittest.main()
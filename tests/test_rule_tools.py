@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for catbridge_tools.rule_tools"""
+
+# Import required modules
+import os
+import tempfile
+import unittest
+from catbridge_tools.rule_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+class KeepFieldRulesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path_to_file = tempfile.mkstemp(suffix='.txt')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path_to_file)
+
+    def load(self, *lines: str) -> KeepFieldRules:
+        with open(self.path_to_file, mode='w', encoding='utf-8') as ofile:
+            ofile.write('\n'.join(lines) + '\n')
+        return KeepFieldRules(self.path_to_file)
+
+    def test_bare_001_line(self):
+        # Field 001 is always kept, so lines for it are ignored
+        rules = self.load('001', '=245  **$a')
+        self.assertEqual(list(rules.rules), ['245'])
+
+    def test_apply(self):
+        rules = self.load('001', '=008  ', '=650  *0$a')
+        record = Record(leader='00000nam a2200000 a 4500')
+        record.add_field(Field('001', data='1'), Field('005', data='20200101'), Field('008', data='data'),
+                         Field('650', indicators=[' ', '0'], subfields=['a', 'Subject', 'x', 'History']),
+                         Field('650', indicators=[' ', '7'], subfields=['a', 'Other']))
+        output = rules.apply(record)
+        self.assertEqual([field.tag for field in output.fields], ['001', '008', '650'])
+        self.assertEqual(output['650'].get_subfields(), ['Subject'])
+
+
+class ControlNumberRulesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path_to_file = tempfile.mkstemp(suffix='.txt')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path_to_file)
+
+    def load(self, *lines: str) -> ControlNumberRules:
+        with open(self.path_to_file, mode='w', encoding='utf-8') as ofile:
+            ofile.write(''.join(line + '\n' for line in lines))
+        return ControlNumberRules(self.path_to_file)
+
+    @staticmethod
+    def make_record() -> Record:
+        record = Record(leader='00000nam a2200000 a 4500')
+        record.add_field(Field('001', data='001234'),
+                         Field('035', indicators=[' ', ' '], subfields=['a', 'A1', 'a', 'B2', 'z', 'B3']),
+                         Field('035', indicators=[' ', ' '], subfields=['a', 'B4']))
+        return record
+
+    def test_config_order(self):
+        # Rules on the same tag and subfield are applied to each field in a single pass,
+        # but control numbers are found in the order of the rules in the config file
+        rules = self.load('=035  **$a\tB[0-9]', '=001\t[0-9]+', '=035  **$a\tA[0-9]', '=035  **$*\tB[0-9]')
+        self.assertEqual(list(rules.find(self.make_record())), ['B2', 'B4', '001234', 'A1', 'B2', 'B3', 'B4'])
+
+    def test_empty_config(self):
+        rules = self.load()
+        self.assertEqual(list(rules.find(self.make_record())), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for catbridge_tools.stats_tools"""
+
+# Import required modules
+import unittest
+from catbridge_tools.stats_tools import *
+
+__author__ = 'Victoria Morris'
+__license__ = 'MIT License'
+__version__ = '1.0.0'
+__status__ = '4 - Beta Development'
+
+
+def make_record(*fields) -> bytes:
+    record = Record(leader='00000nam a2200000 a 4500')
+    record.add_field(*fields)
+    return record.as_marc()
+
+
+class FieldStatisticsTestCase(unittest.TestCase):
+
+    def test_tags(self):
+        statistics = FieldStatistics()
+        statistics.add(make_record(Field('001', data='1'), Field('245', indicators=['1', '0'], subfields=['a', 'T'])))
+        statistics.add(make_record(Field('001', data='2')))
+        self.assertEqual(len(statistics), 2)
+        self.assertEqual(statistics.tags, Counter({'001': 2, '245': 1}))
+        self.assertEqual(statistics.fields_per_record, Counter({1: 1, 2: 1}))
+
+    def test_subfields(self):
+        statistics = FieldStatistics(subfields=True)
+        statistics.add(make_record(Field('001', data='1'),
+                                   Field('245', indicators=['1', '0'], subfields=['a', 'Title', 'c', 'Author'])))
+        result = statistics.as_dict()
+        self.assertEqual(result['indicators'], {'245': {'10': 1}})
+        self.assertEqual(result['subfields'], {'245': {'a': 1, 'c': 1}})
+
+    def test_non_numeric_control_tag(self):
+        # FMT contains no subfields, so its value must not be counted as indicators
+        statistics = FieldStatistics(subfields=True, values=['FMT'])
+        statistics.add(make_record(Field('001', data='1'), Field('FMT', data='BK'),
+                                   Field('650', indicators=[' ', '0'], subfields=['a', 'Subject'])))
+        statistics.add(make_record(Field('001', data='2'), Field('FMT', data='MP')))
+        result = statistics.as_dict()
+        self.assertEqual(result['indicators'], {'650': {'#0': 1}})
+        self.assertEqual(result['subfields'], {'650': {'a': 1}})
+        self.assertEqual(result['values'], {'FMT': {'BK': 1, 'MP': 1}})
+
+
+if __name__ == '__main__':
+    unittest.main()